@@ -1,18 +1,154 @@
+import functools
+import hmac
 import os
-from crypt import crypt
+import threading
+import time
 from pwd import getpwnam
 from spwd import getspnam
 
 import cherrypy
-import pam
-from cherrypy.lib.static import serve_file
+
+try:
+    import pam
+except ImportError:
+    pam = None
+
+try:
+    from crypt import crypt
+except ImportError:
+    crypt = None
+
+try:
+    from passlib.context import CryptContext
+
+    pwd_ctx = CryptContext(schemes=['sha512_crypt', 'sha256_crypt', 'bcrypt', 'md5_crypt'], deprecated='auto')
+except ImportError:
+    pwd_ctx = None
 
 SESSION_KEY = '_cp_username'
 
 
+@functools.cache
+def _url(suffix=''):
+    '''Redirect target under misc.web_root; the root is fixed at
+    startup, so the lookup + concat is done once per suffix rather
+    than on every redirect.'''
+    return cherrypy.config['misc.web_root'] + suffix
+
+
+SPNAM_TTL = 60
+SPNAM_NEGATIVE_TTL = 5
+
+_spnam_cache = {}
+_spnam_lock = threading.Lock()
+
+
+def _getspnam_cached(username):
+    """getspnam with a TTL cache, so login floods do not hammer
+    /etc/shadow (or slower NSS backends) on every attempt.
+
+    Entries are copied out of the spwd struct into a plain tuple;
+    missing users are negative-cached with a shorter TTL."""
+    now = time.monotonic()
+    with _spnam_lock:
+        try:
+            entry, timestamp = _spnam_cache[username]
+        except KeyError:
+            pass
+        else:
+            ttl = SPNAM_TTL if entry is not None else SPNAM_NEGATIVE_TTL
+            if now - timestamp < ttl:
+                if entry is None:
+                    raise KeyError(username)
+                return entry
+
+        try:
+            entry = tuple(getspnam(username))
+        except KeyError:
+            _spnam_cache[username] = (None, now)
+            raise
+        else:
+            _spnam_cache[username] = (entry, now)
+            return entry
+
+
+def invalidate_credentials_cache(username=None):
+    """Drop cached shadow entries, e.g. after a password change."""
+    with _spnam_lock:
+        if username is None:
+            _spnam_cache.clear()
+        else:
+            _spnam_cache.pop(username, None)
+    with _user_exists_lock:
+        if username is None:
+            _user_exists_cache.clear()
+        else:
+            _user_exists_cache.pop(username, None)
+
+
+_user_exists_cache = {}
+_user_exists_lock = threading.Lock()
+
+
+def _user_exists(username):
+    '''getpwnam existence check with the same TTLs as the shadow
+    cache: "no such user" ages out after a few seconds, so probing a
+    name before the account is created cannot wedge it until restart.'''
+    now = time.monotonic()
+    with _user_exists_lock:
+        try:
+            exists, timestamp = _user_exists_cache[username]
+        except KeyError:
+            pass
+        else:
+            ttl = SPNAM_TTL if exists else SPNAM_NEGATIVE_TTL
+            if now - timestamp < ttl:
+                return exists
+
+        try:
+            getpwnam(username)
+        except KeyError:
+            exists = False
+        else:
+            exists = True
+        _user_exists_cache[username] = (exists, now)
+        return exists
+
+
+def _dummy_verify(password):
+    '''Burn the same KDF cost as a real verify so unknown usernames are
+    not distinguishable from bad passwords by response time.'''
+    if pwd_ctx is not None:
+        pwd_ctx.dummy_verify()
+    else:
+        hmac.compare_digest(crypt(password, '$6$mineos$'), '$6$mineos$')
+
+
+def verify_password(password, enc_pwd):
+    """Verify a password against a crypt(3)-style hash.
+
+    passlib dispatches on the $id$ prefix and compares in constant
+    time; hashes it cannot identify - e.g. yescrypt ($y$), the shadow
+    default on current Debian/Ubuntu - fall through to glibc's
+    crypt(3), which still knows them. If neither backend can decide,
+    OSError lets the authenticator chain move on to PAM instead of
+    rejecting the login outright."""
+    if pwd_ctx is not None:
+        try:
+            return pwd_ctx.verify(password, enc_pwd)
+        except ValueError:
+            pass
+
+    if crypt is not None:
+        hashed = crypt(password, enc_pwd)
+        if hashed is not None:
+            return hmac.compare_digest(hashed, enc_pwd)
+    raise OSError('unrecognized password hash')
+
+
 def check_credentials(username, password):
     try:
-        enc_pwd = getspnam(username)[1]
+        enc_pwd = _getspnam_cached(username)[1]
     except KeyError:
         raise OSError("user '%s' not found" % username)
     else:
@@ -23,10 +159,7 @@ def check_credentials(username, password):
         elif enc_pwd == "!!":
             raise OSError('password is expired')
 
-        if crypt(password, enc_pwd) == enc_pwd:
-            return True
-        else:
-            raise OSError('incorrect password')
+        return verify_password(password, enc_pwd)
 
 
 def unix_authenticate(username, password):
@@ -34,11 +167,23 @@ def unix_authenticate(username, password):
     if cryptedpasswd:
         if cryptedpasswd == 'x' or cryptedpasswd == '*':
             raise NotImplementedError("Shadow passwords not supported")
-        return crypt(password, cryptedpasswd) == cryptedpasswd
+        return verify_password(password, cryptedpasswd)
     else:
         return False
 
 
+# Ordered list of password verifiers, resolved once at import; an
+# authenticator that cannot decide (no shadow access, unknown user)
+# raises OSError and the next one is consulted. A plain False is a
+# definitive reject and ends the chain, so a failed login runs the
+# intentionally-slow KDF only once.
+_AUTHENTICATORS = tuple(authenticate for authenticate, available in (
+    (check_credentials, os.access('/etc/shadow', os.R_OK)),
+    (pam.authenticate if pam else None, pam is not None),
+    (unix_authenticate, True),
+) if available)
+
+
 def check_auth(*args, **kwargs):
     conditions = cherrypy.request.config.get('auth.require', None)
     if conditions is not None:
@@ -48,9 +193,9 @@ def check_auth(*args, **kwargs):
             for condition in conditions:
                 # A condition is just a callable that returns true or false
                 if not condition():
-                    raise cherrypy.HTTPRedirect(cherrypy.config['misc.web_root'] + 'auth/login')
+                    raise cherrypy.HTTPRedirect(_url('auth/login'))
         else:
-            raise cherrypy.HTTPRedirect(cherrypy.config['misc.web_root'] + 'auth/login')
+            raise cherrypy.HTTPRedirect(_url('auth/login'))
 
 
 cherrypy.tools.auth = cherrypy.Tool('before_handler', check_auth)
@@ -60,9 +205,15 @@ def require(*conditions):
     def decorate(f):
         if not hasattr(f, '_cp_config'):
             f._cp_config = dict()
-        if 'auth.require' not in f._cp_config:
+        # fold all conditions into one short-circuiting predicate at
+        # decoration time, so check_auth makes a single call per
+        # request instead of looping the original list
+        merged = getattr(f, '_auth_conditions', ()) + conditions
+        f._auth_conditions = merged
+        if merged:
+            f._cp_config['auth.require'] = [lambda: all(c() for c in merged)]
+        else:
             f._cp_config['auth.require'] = []
-        f._cp_config['auth.require'].extend(conditions)
         return f
 
     return decorate
@@ -73,6 +224,10 @@ def require(*conditions):
 class AuthController(object):
     def __init__(self):
         self.html_directory = cherrypy.config['misc.html_directory']
+        self._loginform_path = os.path.join(self.html_directory, 'login.html')
+        with open(self._loginform_path, 'rb') as html:
+            self._loginform_html = html.read()
+        self._loginform_mtime = os.stat(self._loginform_path).st_mtime
 
     def on_login(self, username):
         """Called on successful login"""
@@ -81,28 +236,44 @@ class AuthController(object):
         """Called on logout"""
 
     def get_loginform(self):
-        return serve_file(os.path.join(self.html_directory, 'login.html'))
+        '''Serve login.html from memory; every unauthenticated request
+        lands here, so one stat to detect edits beats serve_file
+        re-opening and re-reading the file each hit.'''
+        mtime = os.stat(self._loginform_path).st_mtime
+        if mtime != self._loginform_mtime:
+            with open(self._loginform_path, 'rb') as html:
+                self._loginform_html = html.read()
+            self._loginform_mtime = mtime
+
+        cherrypy.response.headers['Content-Type'] = 'text/html'
+        return self._loginform_html
 
     @cherrypy.expose
     def login(self, username=None, password=None, hide=None, from_page=None):
         if not username or not password:
             return self.get_loginform()
 
+        # credential-stuffing floods spray nonexistent usernames; skip
+        # the NSS + PAM round-trips for those without leaking timing
+        if not _user_exists(username):
+            _dummy_verify(password)
+            return self.get_loginform()
+
         validated = False
-        try:
-            validated = check_credentials(username, password)
-        except OSError:
-            validated = pam.authenticate(username, password)
-        except ImportError:
-            validated = unix_authenticate(username, password)
-        finally:
-            if validated:
-                cherrypy.session.regenerate()
-                cherrypy.session[SESSION_KEY] = cherrypy.request.login = username
-                self.on_login(username)
-                raise cherrypy.HTTPRedirect(cherrypy.config['misc.web_root'])
-            else:
-                return self.get_loginform()
+        for authenticate in _AUTHENTICATORS:
+            try:
+                validated = authenticate(username, password)
+            except (OSError, NotImplementedError):
+                continue
+            break
+
+        if validated:
+            cherrypy.session.regenerate()
+            cherrypy.session[SESSION_KEY] = cherrypy.request.login = username
+            self.on_login(username)
+            raise cherrypy.HTTPRedirect(_url())
+        else:
+            return self.get_loginform()
 
     @cherrypy.expose
     def logout(self):
@@ -112,4 +283,4 @@ class AuthController(object):
         if username:
             cherrypy.request.login = None
             self.on_logout(username)
-        raise cherrypy.HTTPRedirect(cherrypy.config['misc.web_root'] + 'index')
+        raise cherrypy.HTTPRedirect(_url('index'))
@@ -1,38 +1,59 @@
 import configparser
+import os
+import re
 
+_SECTION = re.compile(r'^\[([^\]]+)\]\s*$')
+_KV = re.compile(r'^\s*([^=;#\s][^=]*?)\s*=\s*(.*?)\s*$')
 
-class config_file_sectionless(object):
-    def __init__(self, filepath):
-        self.filepath = open(filepath, 'r')
-        self.content = self.filepath.read().splitlines()
-        self.fake_section = '[sectionless]\n'
-        self.count = 0
+_fastparse_cache = {}
 
-    def __enter__(self):
-        return self
 
-    def __exit__(self, type, value, traceback):
-        self.filepath.close()
+def fastparse(text):
+    '''Regex-based parse of ini-style text into {section: {key: value}};
+    key=value lines before any section header land under 'sectionless',
+    mirroring config_file. Read-only: no interpolation, no write-back,
+    none of configparser's per-line object allocation.'''
+    parsed = {}
+    section = parsed.setdefault('sectionless', {})
+    for line in text.splitlines():
+        hit = _KV.match(line)
+        if hit:
+            section[hit.group(1)] = hit.group(2)
+            continue
+        hit = _SECTION.match(line)
+        if hit:
+            section = parsed.setdefault(hit.group(1), {})
+    return parsed
 
-    def __next__(self):
-        if self.fake_section:
-            try:
-                return self.fake_section
-            finally:
-                self.fake_section = None
-        else:
-            self.count += 1
-            if self.count > len(self.content):
-                raise StopIteration
-            return self.content[self.count - 1]
 
-    def __iter__(self):
-        return self
+def fastparse_file(filepath):
+    '''fastparse of a file, cached by (mtime, size) so hot read-only
+    paths (port/ip lookups on every status poll) skip both the read
+    and the parse while the file is unchanged. Missing files parse as
+    empty.'''
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return {}
+
+    fingerprint = (st.st_mtime_ns, st.st_size)
+    try:
+        cached_fingerprint, parsed = _fastparse_cache[filepath]
+        if cached_fingerprint == fingerprint:
+            return parsed
+    except KeyError:
+        pass
 
+    with open(filepath, 'r') as conf:
+        parsed = fastparse(conf.read())
+    _fastparse_cache[filepath] = (fingerprint, parsed)
+    return parsed
 
-class config_file(configparser.SafeConfigParser):
+
+class config_file(configparser.RawConfigParser):
     def __init__(self, filepath=None):
-        configparser.SafeConfigParser.__init__(self, allow_no_value=True)
+        self._snapshot = None
+        configparser.RawConfigParser.__init__(self, allow_no_value=True)
         self.filepath = filepath
         self.use_sections(True)
 
@@ -40,8 +61,8 @@ class config_file(configparser.SafeConfigParser):
             self.read(self.filepath)
         except configparser.MissingSectionHeaderError:
             self.use_sections(False)
-            with config_file_sectionless(self.filepath) as cf:
-                self.read_file(cf)
+            with open(self.filepath, 'r') as cf:
+                self.read_string('[sectionless]\n' + cf.read())
         except TypeError:
             if filepath is not None:
                 raise
@@ -52,148 +73,201 @@ class config_file(configparser.SafeConfigParser):
     def __exit__(self, type, value, traceback):
         self.commit()
 
-    def __getitem__(self, option):
+    @property
+    def _snap(self):
+        '''Parsed options snapshotted into plain nested dicts, so reads
+        are single hash lookups instead of configparser re-walking and
+        rebuilding (k, v) lists on every access. Invalidated whenever a
+        section or option is mutated.'''
+        if self._snapshot is None:
+            self._snapshot = {sec: dict(self.items(sec)) for sec in self.sections()}
+        return self._snapshot
+
+    def set(self, section, option, value=None):
+        self._snapshot = None
+        return configparser.RawConfigParser.set(self, section, option, value)
+
+    def remove_option(self, section, option):
+        self._snapshot = None
+        return configparser.RawConfigParser.remove_option(self, section, option)
+
+    def add_section(self, section):
+        self._snapshot = None
+        return configparser.RawConfigParser.add_section(self, section)
+
+    def remove_section(self, section):
+        self._snapshot = None
+        return configparser.RawConfigParser.remove_section(self, section)
+
+    GET_SYNTAX = {
+        True: "config_file get syntax: "
+              "var[:] or "
+              "var['section'] or "
+              "var['section':'option'] or "
+              "var['section':'option':'defaultval']",
+        False: "config_file get syntax: "
+               "var[:] or "
+               "var['option'] or "
+               "var['option'::'defaultval']"
+    }
+    SET_SYNTAX = {
+        True: "config_file set syntax: var['section':'option'] = val",
+        False: "config_file set syntax: var['option'] = val"
+    }
+    DEL_SYNTAX = {
+        True: "config_file del syntax: del var['section':'option']",
+        False: "config_file del syntax: del var['option']"
+    }
+
+    def _get_str(self, option):
         if self._use_sections:
-            syntax_error = "config_file get syntax: " \
-                           "var[:] or " \
-                           "var['section'] or " \
-                           "var['section':'option'] or " \
-                           "var['section':'option':'defaultval']"
-            if type(option) is str:
+            try:
+                return self._snap[option]
+            except KeyError:
+                raise KeyError("No section: %s" % option)
+        else:
+            try:
+                return self._snap['sectionless'][option]
+            except KeyError:
+                raise KeyError(option)
+
+    def _get_slice(self, option):
+        if self._use_sections:
+            if type(option.start) is str and type(option.stop) is str:
                 try:
-                    return dict(self.items(option))
-                except configparser.NoSectionError:
-                    raise KeyError("No section: %s" % option)
-            elif type(option) is slice:
-                if type(option.start) is str and type(option.stop) is str:
-                    try:
-                        return self.get(option.start, option.stop)
-                    except configparser.NoSectionError:
-                        raise KeyError(option.start)
-                    except configparser.NoOptionError:
-                        if option.step is not None:
-                            return option.step
-                        else:
-                            raise KeyError(option.start)
-                elif type(option.start) is str and \
-                        option.stop is None and \
-                        option.step is None:
-                    try:
-                        return dict(self.items(option.start))
-                    except configparser.NoSectionError:
-                        raise KeyError("No section: %s" % option.start)
-                else:
-                    if option.start is None and option.stop is None and option.step is None:
-                        return {sec: dict(self.items(sec)) for sec in self.sections()}
-                    elif type(option.start) is not str:
-                        raise TypeError('First argument must be string not %s' % type(option.start))
+                    section = self._snap[option.start]
+                except KeyError:
+                    raise KeyError(option.start)
+                try:
+                    return section[option.stop]
+                except KeyError:
+                    if option.step is not None:
+                        return option.step
                     else:
-                        raise TypeError('Second argument must be string not %s' % type(option.stop))
+                        raise KeyError(option.start)
+            elif type(option.start) is str and \
+                    option.stop is None and \
+                    option.step is None:
+                try:
+                    return self._snap[option.start]
+                except KeyError:
+                    raise KeyError("No section: %s" % option.start)
             else:
-                raise TypeError(syntax_error)
+                if option.start is None and option.stop is None and option.step is None:
+                    return self._snap
+                elif type(option.start) is not str:
+                    raise TypeError('First argument must be string not %s' % type(option.start))
+                else:
+                    raise TypeError('Second argument must be string not %s' % type(option.stop))
         else:
-            syntax_error = "config_file get syntax: " \
-                           "var[:] or " \
-                           "var['option'] or " \
-                           "var['option'::'defaultval']"
-            if type(option) is str:
+            if type(option.start) is str and option.stop is None:
                 try:
-                    return self.get('sectionless', option)
-                except configparser.NoOptionError:
-                    raise KeyError(option)
-            elif type(option) is slice:
-                if type(option.start) is str and option.stop is None:
-                    try:
-                        return self.get('sectionless', option.start)
-                    except configparser.NoOptionError:
-                        if option.step is not None:
-                            return option.step
-                        else:
-                            raise KeyError(option.start)
-                else:
-                    if option.start is None and option.stop is None and option.step is None:
-                        return dict(self.items('sectionless'))
-                    elif option.stop is not None:
-                        raise SyntaxError(syntax_error)
+                    return self._snap['sectionless'][option.start]
+                except KeyError:
+                    if option.step is not None:
+                        return option.step
                     else:
-                        raise TypeError(syntax_error)
+                        raise KeyError(option.start)
             else:
-                raise TypeError(syntax_error)
+                if option.start is None and option.stop is None and option.step is None:
+                    return self._snap['sectionless']
+                elif option.stop is not None:
+                    raise SyntaxError(self.GET_SYNTAX[False])
+                else:
+                    raise TypeError(self.GET_SYNTAX[False])
 
-    def __setitem__(self, option, value):
+    _GET_DISPATCH = {str: _get_str, slice: _get_slice}
+
+    def __getitem__(self, option):
+        try:
+            handler = self._GET_DISPATCH[type(option)]
+        except KeyError:
+            raise TypeError(self.GET_SYNTAX[self._use_sections])
+        return handler(self, option)
+
+    def _set_str(self, option, value):
         if self._use_sections:
-            syntax_error = "config_file set syntax: " \
-                           "var['section':'option'] = val"
-            if type(option) is slice:
-                if option.step is not None:
-                    raise SyntaxError(syntax_error)
-                elif type(option.start) is str and type(option.stop) is str:
-                    if option.step:
-                        raise SyntaxError(syntax_error)
-                    else:
-                        if type(value) in (int, str):
-                            try:
-                                self.set(option.start, option.stop, str(value))
-                            except configparser.NoSectionError:
-                                raise KeyError('No section called %s' % option.start)
-                        else:
-                            raise ValueError('Value may only be int or string')
-                else:
-                    if type(option.start) is not str:
-                        raise TypeError('First argument must be string not %s' % type(option.start))
-                    else:
-                        raise TypeError('Second argument must be string not %s' % type(option.stop))
+            raise SyntaxError(self.SET_SYNTAX[True])
+        self.set('sectionless', str(option), str(value))
+
+    def _set_slice(self, option, value):
+        if not self._use_sections:
+            raise SyntaxError(self.SET_SYNTAX[False])
+        elif option.step is not None:
+            raise SyntaxError(self.SET_SYNTAX[True])
+        elif type(option.start) is str and type(option.stop) is str:
+            if type(value) in (int, str):
+                try:
+                    self.set(option.start, option.stop, str(value))
+                except configparser.NoSectionError:
+                    raise KeyError('No section called %s' % option.start)
             else:
-                raise SyntaxError(syntax_error)
+                raise ValueError('Value may only be int or string')
         else:
-            syntax_error = "config_file set syntax: " \
-                           "var['option'] = val"
-            if type(option) is str:
-                self.set('sectionless', str(option), str(value))
-            elif type(option) is slice:
-                raise SyntaxError(syntax_error)
+            if type(option.start) is not str:
+                raise TypeError('First argument must be string not %s' % type(option.start))
+            else:
+                raise TypeError('Second argument must be string not %s' % type(option.stop))
+
+    _SET_DISPATCH = {str: _set_str, slice: _set_slice}
+
+    def __setitem__(self, option, value):
+        try:
+            handler = self._SET_DISPATCH[type(option)]
+        except KeyError:
+            if self._use_sections:
+                raise SyntaxError(self.SET_SYNTAX[True])
             else:
                 raise TypeError('Inappropriate argument type: %s' % type(option))
+        handler(self, option, value)
 
-    def __delitem__(self, option):
+    def _del_str(self, option):
         if self._use_sections:
-            syntax_error = "config_file del syntax: " \
-                           "del var['section':'option']"
-            if type(option) is slice:
-                if option.step is not None:
-                    raise SyntaxError(syntax_error)
-                elif option.stop is None:
-                    raise SyntaxError(syntax_error)
-                elif type(option.start) is str and type(option.stop) is str:
-                    try:
-                        self.remove_option(option.start, option.stop)
-                    except configparser.NoSectionError:
-                        raise KeyError(option.start)
-                elif type(option.start) is not str:
-                    raise TypeError('Inappropriate argument type: %s' % type(option.start))
-                else:
-                    raise TypeError('Inappropriate argument type: %s' % type(option.stop))
+            raise SyntaxError(self.DEL_SYNTAX[True])
+        self.remove_option('sectionless', str(option))
 
-            else:
-                raise SyntaxError(syntax_error)
+    def _del_slice(self, option):
+        if not self._use_sections:
+            raise SyntaxError(self.DEL_SYNTAX[False])
+        elif option.step is not None:
+            raise SyntaxError(self.DEL_SYNTAX[True])
+        elif option.stop is None:
+            raise SyntaxError(self.DEL_SYNTAX[True])
+        elif type(option.start) is str and type(option.stop) is str:
+            try:
+                self.remove_option(option.start, option.stop)
+            except configparser.NoSectionError:
+                raise KeyError(option.start)
+        elif type(option.start) is not str:
+            raise TypeError('Inappropriate argument type: %s' % type(option.start))
         else:
-            syntax_error = "config_file del syntax: " \
-                           "del var['option']"
-            if type(option) is str:
-                self.remove_option('sectionless', str(option))
-            elif type(option) is slice:
-                raise SyntaxError(syntax_error)
+            raise TypeError('Inappropriate argument type: %s' % type(option.stop))
+
+    _DEL_DISPATCH = {str: _del_str, slice: _del_slice}
+
+    def __delitem__(self, option):
+        try:
+            handler = self._DEL_DISPATCH[type(option)]
+        except KeyError:
+            if self._use_sections:
+                raise SyntaxError(self.DEL_SYNTAX[True])
             else:
                 raise TypeError('Inappropriate argument type: %s' % type(option))
+        handler(self, option)
 
     def commit(self):
-        if self._use_sections:
-            with open(self.filepath, 'w') as configfile:
+        # write-then-rename: a plain open(..., 'w') truncates in place,
+        # and concurrent readers (request threads re-stat and reparse on
+        # mtime change) would observe an empty or half-written file
+        tmp = '%s.%s.tmp' % (self.filepath, os.urandom(4).hex())
+        with open(tmp, 'w') as configfile:
+            if self._use_sections:
                 self.write(configfile)
-        else:
-            with open(self.filepath, "w") as configfile:
-                for k, v in self.items('sectionless'):
-                    configfile.write("%s=%s\n" % (k.strip(), v.strip()))
+            else:
+                payload = "".join("%s=%s\n" % (k.strip(), v.strip())
+                                  for k, v in self.items('sectionless'))
+                configfile.write(payload)
+        os.replace(tmp, self.filepath)
 
     def use_sections(self, value):
         if value:
@@ -1,17 +1,16 @@
 #!/usr/bin/python3
 
 import configparser
+import io
 import os
 import re
 import subprocess
-import tarfile
+import threading
 import time
-import zipfile
 from collections import namedtuple
 from datetime import datetime
-from distutils.dir_util import copy_tree
 from distutils.spawn import find_executable
-from functools import wraps
+from functools import cached_property, lru_cache, wraps
 from getpass import getuser
 from grp import getgrgid
 from itertools import chain
@@ -19,13 +18,56 @@ from pwd import getpwuid, getpwnam
 from shlex import split
 from shutil import rmtree
 from string import ascii_letters, digits
-from xml.dom.minidom import parseString
 
 import cherrypy
-from mcstatus import MinecraftServer
 
 import procfs_reader
-from conf_reader import config_file
+from conf_reader import config_file, fastparse_file
+
+
+# translate tables deleting every allowed character, so validation is
+# one C-level translate: anything left over is an invalid character
+_SERVER_NAME_DELETE = {ord(c): None for c in '%s%s_.' % (ascii_letters, digits)}
+_FILENAME_DELETE = {ord(c): None for c in '%s%s-_.' % (ascii_letters, digits)}
+
+_S3_URL = re.compile(r'https://s3\.amazonaws\.com/Minecraft\.Download/versions/([^/]+)')
+
+# hot-path patterns compiled once at import rather than per call
+_SCREEN_RE = re.compile(r'SCREEN.*?mc-([\w._]+).*?-jar ([\w._/]+)', re.IGNORECASE)
+_INC_SIZE_RE = re.compile(r'^(\w.*?) {3,}(.*?) {2,}([^ ]+ \w*)', re.MULTILINE)
+
+_POM_CANDIDATES = (r'META-INF/maven/org.bukkit/craftbukkit/pom.xml',
+                   r'META-INF/maven/mcpc/mcpc-plus-legacy/pom.xml',
+                   r'META-INF/maven/mcpc/mcpc-plus/pom.xml',
+                   r'META-INF/maven/org.spigotmc/spigot/pom.xml',
+                   r'META-INF/maven/net.md-5/bungeecord-api/pom.xml')
+
+
+# NSS lookups can be remote (LDAP/SSSD) and the ownership checks run in
+# loops over every server; uid/gid/name churn is low enough that a small
+# LRU is effectively permanent for the process
+@lru_cache(maxsize=256)
+def _pw_uid(uid):
+    return getpwuid(uid)
+
+
+@lru_cache(maxsize=256)
+def _gr_gid(gid):
+    return getgrgid(gid)
+
+
+@lru_cache(maxsize=256)
+def _pw_nam(name):
+    return getpwnam(name)
+
+
+def _dispose_directory(path):
+    '''Rename the directory out of the way and unlink it in a daemon
+    thread: the caller pays one rename while deleting a multi-gigabyte
+    world tree proceeds in the background.'''
+    trash = '%s.trash.%s' % (path, os.urandom(4).hex())
+    os.rename(path, trash)
+    threading.Thread(target=rmtree, args=(trash,), kwargs={'ignore_errors': True}, daemon=True).start()
 
 
 def sanitize(fn):
@@ -73,6 +115,17 @@ def server_up(up):
     return dec
 
 
+class _lazy_binary_paths(dict):
+    '''$PATH resolution deferred to first use: eagerly resolving all
+    eight binaries stat()ed every $PATH entry on every import, CLI
+    one-shots included. Resolved paths are memoized per process.'''
+
+    def __missing__(self, binary):
+        path = find_executable(binary)
+        self[binary] = path
+        return path
+
+
 class mc(object):
     NICE_VALUE = 10
     DEFAULT_PATHS = {
@@ -81,16 +134,7 @@ class mc(object):
         'archive': 'archive',
         'import': 'import'
     }
-    BINARY_PATHS = {
-        'rdiff-backup': find_executable('rdiff-backup'),
-        'rsync': find_executable('rsync'),
-        'screen': find_executable('screen'),
-        'java': find_executable('java'),
-        'nice': find_executable('nice'),
-        'tar': find_executable('tar'),
-        'kill': find_executable('kill'),
-        'wget': find_executable('wget'),
-    }
+    BINARY_PATHS = _lazy_binary_paths()
 
     def __init__(self, server_name, owner=None, base_directory=None):
 
@@ -107,34 +151,76 @@ class mc(object):
     def _set_environment(self):
         self.server_properties = None
         self.server_config = None
+        self._config_loaded = False
+
+        # plain f-string joins: components are validated (valid_server_name)
+        # and DEFAULT_PATHS entries are bare directory names, so there is
+        # nothing for os.path.join to normalize
+        base = self.base
+        name = self.server_name
+        paths = self.DEFAULT_PATHS
+        cwd = f"{base}/{paths['servers']}/{name}"
+        bwd = f"{base}/{paths['backup']}/{name}"
 
         self.env = {
-            'cwd': os.path.join(self.base, self.DEFAULT_PATHS['servers'], self.server_name),
-            'bwd': os.path.join(self.base, self.DEFAULT_PATHS['backup'], self.server_name),
-            'awd': os.path.join(self.base, self.DEFAULT_PATHS['archive'], self.server_name),
+            'cwd': cwd,
+            'bwd': bwd,
+            'awd': f"{base}/{paths['archive']}/{name}",
+            'sp': f'{cwd}/server.properties',
+            'sc': f'{cwd}/server.config',
+            'sp_backup': f'{bwd}/server.properties',
+            'sc_backup': f'{bwd}/server.config',
+            'log': f'{cwd}/logs/latest.log',
         }
 
-        self.env.update({
-            'sp': os.path.join(self.env['cwd'], 'server.properties'),
-            'sc': os.path.join(self.env['cwd'], 'server.config'),
-            'sp_backup': os.path.join(self.env['bwd'], 'server.properties'),
-            'sc_backup': os.path.join(self.env['bwd'], 'server.config')
-        })
+    # cached_property command builders below; their cached strings must
+    # be dropped whenever the config they were built from changes
+    _CMD_PROP_NAMES = ('command_start', 'command_debug', 'command_archive',
+                       'command_backup', 'command_kill', 'command_list_increments',
+                       'command_list_increment_sizes')
 
-        self.env['log'] = os.path.join(self.env['cwd'], os.path.join('logs', 'latest.log'))
+    def _invalidate_commands(self):
+        for name in self._CMD_PROP_NAMES:
+            self.__dict__.pop(name, None)
+
+    # parsed config_file objects shared process-wide, keyed by path and
+    # invalidated by mtime: every request builds a fresh mc instance,
+    # so without this each request re-tokenizes both config files
+    _config_cache = {}
+
+    @classmethod
+    def _cached_config_file(cls, filepath):
+        try:
+            mtime = os.stat(filepath).st_mtime_ns
+        except OSError:
+            # missing file: nothing to fingerprint, hand back an
+            # uncached (empty) parser
+            return config_file(filepath)
+
+        try:
+            cached_mtime, cf = cls._config_cache[filepath]
+            if cached_mtime == mtime:
+                return cf
+        except KeyError:
+            pass
+
+        cf = config_file(filepath)
+        cls._config_cache[filepath] = (mtime, cf)
+        return cf
 
     def _load_config(self, load_backup=False, generate_missing=False):
         def load_sp():
-            self.server_properties = config_file(self.env['sp_backup']) if load_backup else config_file(self.env['sp'])
+            self.server_properties = self._cached_config_file(self.env['sp_backup'] if load_backup else self.env['sp'])
             self.server_properties.use_sections(False)
             return self.server_properties[:]
 
         def load_sc():
-            self.server_config = config_file(self.env['sc_backup']) if load_backup else config_file(self.env['sc'])
+            self.server_config = self._cached_config_file(self.env['sc_backup'] if load_backup else self.env['sc'])
             return self.server_config[:]
 
         load_sc()
         load_sp()
+        self._invalidate_commands()
 
         if generate_missing and not load_backup:
             if self.server_properties[:] and self.server_config[:]:
@@ -148,6 +234,10 @@ class mc(object):
             else:
                 raise RuntimeError('No config files found: server.properties or server.config')
 
+        # backup configs are a temporary view for restore; only a live
+        # load marks the instance as ready so start() can skip a reload
+        self._config_loaded = not load_backup
+
     @server_exists(True)
     def _create_sp(self, startup_values={}):
         defaults = {
@@ -176,11 +266,12 @@ class mc(object):
             if option not in sanitize_integers:
                 defaults[option] = value
 
-        self._command_direct('touch %s' % self.env['sp'], self.env['cwd'])
+        self._touch(self.env['sp'])
         with config_file(self.env['sp']) as sp:
             sp.use_sections(False)
             for key, value in defaults.items():
                 sp[key] = str(value)
+        self._config_cache.pop(self.env['sp'], None)
 
     def _create_sc(self, startup_values={}):
         defaults = {
@@ -212,12 +303,13 @@ class mc(object):
             except (KeyError, ValueError):
                 d[section][option] = defaults[section][option]
 
-        self._command_direct('touch %s' % self.env['sc'], self.env['cwd'])
+        self._touch(self.env['sc'])
         with config_file(self.env['sc']) as sc:
             for section in d:
                 sc.add_section(section)
                 for option in d[section]:
                     sc[section:option] = str(d[section][option])
+        self._config_cache.pop(self.env['sc'], None)
 
     @server_exists(False)
     def create(self, sc={}, sp={}):
@@ -232,32 +324,46 @@ class mc(object):
 
     @server_exists(True)
     def modify_config(self, option, value, section=None):
-        if section:
-            with self.server_config as sc:
-                sc[section:option] = value
-        else:
-            with self.server_properties as sp:
-                sp[option] = value
+        # write through a private parser, as _create_sp/_create_sc do:
+        # the cached parser is shared read-only across request threads,
+        # and mutating it in place would race concurrent _snap rebuilds
+        # in the pooled status workers
+        filepath = self.server_config.filepath if section else self.server_properties.filepath
+        with config_file(filepath) as conf:
+            if section:
+                conf[section:option] = value
+            else:
+                conf.use_sections(False)
+                conf[option] = value
+        # commit() above rewrote the file; drop the cache entry rather
+        # than trusting mtime granularity to notice, then rebind this
+        # instance to the fresh contents
+        self._config_cache.pop(filepath, None)
+        self._load_config()
 
     @server_exists(True)
     @server_up(False)
     def start(self):
-        if self.port in [s.port for s in self.list_ports_up(self.base)]:
-            if (self.port, self.ip_address) in [(s.port, s.ip_address) for s in self.list_ports_up(self.base)]:
+        ports_up = list(self.list_ports_up(self.base))
+        if self.port in {s.port for s in ports_up}:
+            if (self.port, self.ip_address) in {(s.port, s.ip_address) for s in ports_up}:
                 raise RuntimeError('Couldn\'t start server, server already up at %s:%s.' % (self.ip_address, self.port))
             elif self.ip_address == '0.0.0.0':
                 raise RuntimeError(
                     'Couldn\'t start server, can not listen on (0.0.0.0) if port %s already in use.' % self.port)
-            elif any(s for s in self.list_ports_up(self.base) if s.ip_address == '0.0.0.0'):
+            elif any(s.ip_address == '0.0.0.0' for s in ports_up):
                 raise RuntimeError('Couldn\'t start server, server already listening on ip address (0.0.0.0).')
 
-        self._load_config(generate_missing=True)
+        if not self._config_loaded:
+            self._load_config(generate_missing=True)
         self._command_direct(self.command_start, self.env['cwd'])
+        self._invalidate_servers_up()
 
     @server_exists(True)
     @server_up(True)
     def kill(self):
         self._command_direct(self.command_kill, self.env['cwd'])
+        self._invalidate_servers_up()
 
     @server_exists(True)
     @server_up(True)
@@ -267,21 +373,53 @@ class mc(object):
     @server_exists(True)
     @server_up(True)
     def stop_and_backup(self):
-        last_mirror = self.list_increments().current_mirror
+        java_pid = self.java_pid
+        last_mirror = self._current_mirror_markers()
 
         self._command_stuff('stop')
-        while self.up:
-            time.sleep(1)
+        self._invalidate_servers_up()
+        if java_pid:
+            # one /proc stat per poll instead of a full process-table
+            # scan through list_servers_up
+            while procfs_reader.pid_exists(java_pid):
+                time.sleep(1)
+        else:
+            while self.up:
+                time.sleep(1)
 
         self._command_direct(self.command_backup, self.env['cwd'])
 
-        while last_mirror == self.list_increments().current_mirror:
+        # gate the marker re-listing on the data directory's mtime:
+        # each quiet poll is a single stat, and the markers are only
+        # re-read when something actually changed underneath
+        data_dir = os.path.join(self.env['bwd'], 'rdiff-backup-data')
+        last_change = None
+        while True:
+            try:
+                change = os.stat(data_dir).st_mtime_ns
+            except OSError:
+                change = None
+            if change != last_change:
+                if self._current_mirror_markers() != last_mirror:
+                    break
+                last_change = change
             time.sleep(1)
 
+    def _current_mirror_markers(self):
+        '''Filenames of rdiff-backup's current_mirror markers, which
+        change exactly when a new mirror lands; a directory read here
+        replaces forking rdiff-backup --list-increments per poll.'''
+        data_dir = os.path.join(self.env['bwd'], 'rdiff-backup-data')
+        try:
+            return sorted(f for f in os.listdir(data_dir) if f.startswith('current_mirror'))
+        except OSError:
+            return []
+
     @server_exists(True)
     @server_up(True)
     def stop(self):
         self._command_stuff('stop')
+        self._invalidate_servers_up()
 
     @server_exists(True)
     def archive(self):
@@ -299,8 +437,7 @@ class mc(object):
     def backup(self):
         self._make_directory(self.env['bwd'])
         if self.up:
-            self._command_stuff('save-off')
-            self._command_stuff('save-all')
+            self._command_stuff('save-off', 'save-all')
             self._command_direct(self.command_backup, self.env['cwd'])
             self._command_stuff('save-on')
         else:
@@ -326,39 +463,82 @@ class mc(object):
 
     @server_exists(False)
     def import_server(self, path, filename):
+        import tarfile
+        import zipfile
+
         filepath = os.path.join(path, filename)
 
         if tarfile.is_tarfile(filepath):
-            archive_ = tarfile.open(filepath, mode='r')
-            members_ = archive_.getnames()
-            prefix_ = os.path.commonprefix(members_)
+            # 1 MiB blocks instead of the 10 KiB default: imports are
+            # dominated by many small writes, so fewer, larger reads on
+            # the compressed side keep the extract loop fed
+            archive_ = tarfile.open(filepath, mode='r', bufsize=1048576)
+            members_ = iter(archive_)
+            member_name = lambda m: m.name
         elif zipfile.is_zipfile(filepath):
             archive_ = zipfile.ZipFile(filepath, 'r')
-            members_ = archive_.namelist()
-            prefix_ = os.path.commonprefix(members_)
+            members_ = iter(archive_.namelist())
+            member_name = lambda m: m
         else:
             raise NotImplementedError('Ignoring command {import_server};'
                                       'archive file must be compressed tar or zip')
 
-        if any(f for f in members_ if f.startswith('/') or '../' in f):
-            raise RuntimeError('Ignoring command {import_server};'
-                               'archive contains files with absolute path or ../')
+        # validation and common-prefix folding are fused into the member
+        # stream extractall consumes, so the archive is walked exactly
+        # once; an unsafe name aborts as soon as it is seen
+        prefix_ = ['']
+
+        def checked(members, first=True):
+            for member in members:
+                name = member_name(member)
+                if name.startswith('/') or '../' in name:
+                    raise RuntimeError('Ignoring command {import_server};'
+                                       'archive contains files with absolute path or ../')
+                if first:
+                    prefix_[0] = name
+                    first = False
+                else:
+                    prefix_[0] = os.path.commonprefix((prefix_[0], name))
+                yield member
 
-        archive_.extractall(self.env['cwd'])
+        try:
+            archive_.extractall(self.env['cwd'], members=checked(members_))
+        except RuntimeError:
+            # an unsafe member aborts mid-extraction; drop whatever
+            # landed so the name is not wedged as an existing server
+            # holding partial attacker-chosen content
+            archive_.close()
+            try:
+                _dispose_directory(self.env['cwd'])
+            except OSError:
+                pass
+            raise
         archive_.close()
 
+        # the folded prefix can stop mid-filename ('server.' for a flat
+        # archive); only a prefix that names a real extracted directory
+        # is a wrapper worth stripping
+        prefix_ = prefix_[0]
+        if not os.path.isdir(os.path.join(self.env['cwd'], prefix_)):
+            prefix_ = os.path.dirname(prefix_)
+
         if not os.path.samefile(self.env['cwd'], os.path.join(self.env['cwd'], prefix_)):
             prefixed_dir = os.path.join(self.env['cwd'], prefix_)
-            copy_tree(prefixed_dir, self.env['cwd'])
+            # same filesystem: renames are inode updates, not the full
+            # re-copy + delete that copy_tree/rmtree performed; replace
+            # rather than rename so a pre-existing entry cannot abort
+            # the import halfway through
+            for entry in os.listdir(prefixed_dir):
+                os.replace(os.path.join(prefixed_dir, entry), os.path.join(self.env['cwd'], entry))
 
-            rmtree(prefixed_dir)
+            os.rmdir(prefixed_dir)
 
         os.chmod(self.env['cwd'], 0o775)
 
         try:
             self._load_config(generate_missing=True)
         except RuntimeError:
-            rmtree(self.env['cwd'])
+            _dispose_directory(self.env['cwd'])
             raise
 
     @server_exists(True)
@@ -366,12 +546,21 @@ class mc(object):
         self._command_direct(self.command_prune(step), self.env['bwd'])
 
     def prune_archives(self, filename):
-        self._command_direct(self.command_delete_files(filename), self.env['awd'])
+        # in-process unlink; forking rm cost more than the deletion.
+        # filenames arrive straight from the web API: valid_filename
+        # rejects path separators and leading dots, so every token is
+        # pinned inside the archive directory
+        for f in split(filename):
+            os.remove(os.path.join(self.env['awd'], self.valid_filename(f)))
 
     @server_exists(True)
     @server_up(False)
     def delete_server(self):
-        self._command_direct(self.command_delete_server, self.env['pwd'])
+        for d in ('cwd', 'bwd', 'awd'):
+            try:
+                _dispose_directory(self.env[d])
+            except OSError:
+                continue
 
     @server_exists(True)
     def accept_eula(self):
@@ -383,73 +572,104 @@ class mc(object):
 
     @staticmethod
     def server_version(filepath, guess=''):
+        import zipfile
+
+        # jars are immutable in practice, so the zip walk + pom parse
+        # is memoized on the file fingerprint; repeat display calls are
+        # one stat plus a dict hit
         try:
-            with zipfile.ZipFile(filepath, 'r') as zf:
-                files = zf.namelist()
-                for internal_path in [r'META-INF/maven/org.bukkit/craftbukkit/pom.xml',
-                                      r'META-INF/maven/mcpc/mcpc-plus-legacy/pom.xml',
-                                      r'META-INF/maven/mcpc/mcpc-plus/pom.xml',
-                                      r'META-INF/maven/org.spigotmc/spigot/pom.xml',
-                                      r'META-INF/maven/net.md-5/bungeecord-api/pom.xml']:
-                    if internal_path in files:
-                        for tag in ['minecraft.version', 'version']:
-                            try:
-                                xml = parseString(zf.read(internal_path))
-                                return xml.getElementsByTagName(tag)[0].firstChild.nodeValue
-                            except (IndexError, KeyError, AttributeError):
-                                continue
-        except (IOError, zipfile.BadZipfile):
+            st = os.stat(filepath)
+        except OSError:
             return ''
-        else:
-            match = re.match('https://s3.amazonaws.com/Minecraft.Download/versions/([^/]+)', guess)
+        key = (filepath, st.st_mtime_ns, st.st_size)
+
+        try:
+            version = mc._version_cache[key]
+        except KeyError:
             try:
-                return match.group(1)
-            except AttributeError:
+                version = mc._jar_version(filepath)
+            except (IOError, zipfile.BadZipfile):
                 return ''
+            if len(mc._version_cache) > 256:
+                mc._version_cache.clear()
+            mc._version_cache[key] = version
 
-    # actual command execution methods
+        if version is not None:
+            return version
+
+        match = _S3_URL.match(guess)
+        try:
+            return match.group(1)
+        except AttributeError:
+            return ''
+
+    _version_cache = {}
 
     @staticmethod
-    def _demote(user_uid, user_gid):
-        def set_ids():
-            os.umask(2)
-            os.setgid(user_gid)
-            os.setuid(user_uid)
+    def _jar_version(filepath):
+        '''Version string from the jar's embedded pom, or None.'''
+        import zipfile
+        from xml.etree import ElementTree
+
+        with zipfile.ZipFile(filepath, 'r') as zf:
+            info_by_name = {i.filename: i for i in zf.infolist()}
+            for internal_path in _POM_CANDIDATES:
+                info = info_by_name.get(internal_path)
+                if info is not None:
+                    # stream the pom with expat instead of building
+                    # a full minidom tree to read a single tag
+                    versions = {}
+                    try:
+                        for event, elem in ElementTree.iterparse(io.BytesIO(zf.read(info)),
+                                                                 events=('end',)):
+                            tag = elem.tag.rpartition('}')[2]
+                            if tag in ('minecraft.version', 'version') and tag not in versions:
+                                versions[tag] = elem.text
+                            elem.clear()
+                    except (KeyError, ElementTree.ParseError):
+                        continue
+
+                    for tag in ('minecraft.version', 'version'):
+                        if versions.get(tag):
+                            return versions[tag]
+        return None
 
-        return set_ids
+    # actual command execution methods
 
     def _command_direct(self, command, working_directory):
+        # native user/group/umask demotion runs in C between fork and
+        # exec; a Python preexec_fn would force the slow fork path
         return subprocess.check_output(split(command), cwd=working_directory, stderr=subprocess.STDOUT,
-                                       preexec_fn=self._demote(self.owner.pw_uid, self.owner.pw_gid))
+                                       user=self.owner.pw_uid, group=self.owner.pw_gid, umask=0o002)
 
     @server_exists(True)
     @server_up(True)
-    def _command_stuff(self, stuff_text):
+    def _command_stuff(self, *stuff_texts):
+        # several console lines can ride one screen invocation; the
+        # subprocess spawn costs more than the stuffed command itself
         command = """%s -S %d -p 0 -X eval 'stuff "%s\012"'""" % (
-            self.BINARY_PATHS['screen'], self.screen_pid, stuff_text)
-        subprocess.check_call(split(command), preexec_fn=self._demote(self.owner.pw_uid, self.owner.pw_gid))
+            self.BINARY_PATHS['screen'], self.screen_pid, '\012'.join(stuff_texts))
+        subprocess.check_call(split(command), user=self.owner.pw_uid, group=self.owner.pw_gid, umask=0o002)
 
     # validation checks
 
     @staticmethod
+    @lru_cache(maxsize=512)
     def valid_server_name(name):
-        valid_chars = set('%s%s_.' % (ascii_letters, digits))
-
         if not name:
             raise ValueError('Servername must be a string at least 1 length')
-        elif any(c for c in name if c not in valid_chars):
+        elif name.translate(_SERVER_NAME_DELETE):
             raise ValueError('Servername contains invalid characters')
         elif name.startswith('.'):
             raise ValueError('Servername may not start with "."')
         return name
 
     @staticmethod
+    @lru_cache(maxsize=512)
     def valid_filename(filename):
-        valid_chars = set('%s%s-_.' % (ascii_letters, digits))
-
         if not filename:
             raise ValueError('Filename is empty')
-        elif any(c for c in filename if c not in valid_chars):
+        elif filename.translate(_FILENAME_DELETE):
             raise ValueError('Disallowed characters in filename "%s"' % filename)
         elif filename.startswith('.'):
             raise ValueError('Files should not be hidden: "%s"' % filename)
@@ -463,9 +683,11 @@ class mc(object):
     def base(self):
         return self._base_directory
 
-    @property
+    @cached_property
     def owner(self):
-        return getpwnam(self._owner)
+        # resolved once per instance: _command_direct/_command_stuff
+        # read pw_uid/pw_gid on every subprocess launch
+        return _pw_nam(self._owner)
 
     @property
     def up(self):
@@ -519,10 +741,8 @@ class mc(object):
             return r
 
         try:
-            mem_str = dict(procfs_reader.entries(self.java_pid, 'status'))['VmRSS']
-            mem = int(mem_str.split()[0]) * 1024
-            return '%s MB' % bytesto(mem, 'm')
-        except IOError:
+            return '%s MB' % bytesto(procfs_reader.vmrss(self.java_pid), 'm')
+        except (IOError, TypeError):
             return '0'
 
     @property
@@ -535,6 +755,8 @@ class mc(object):
 
         if self.up:
             try:
+                from mcstatus import MinecraftServer
+
                 server = MinecraftServer(self.ip_address, self.port)
                 status = server.status()
                 return server_ping(status.version.protocol, status.version.name, status.description,
@@ -573,168 +795,173 @@ class mc(object):
         except AttributeError:
             return {}
 
-    @property
+    @cached_property
+    def _nice_prefix(self):
+        # shared by the archive/backup builders; cached_property rather
+        # than __init__ so BINARY_PATHS stays lazily resolved
+        return f"{self.BINARY_PATHS['nice']} -n {self.NICE_VALUE}"
+
+    @cached_property
+    def _rdiff(self):
+        return self.BINARY_PATHS['rdiff-backup']
+
+    @cached_property
     @sanitize
     def command_start(self):
-        required_arguments = {
-            'screen_name': 'mc-%s' % self.server_name,
-            'screen': self.BINARY_PATHS['screen'],
-            'java': self.BINARY_PATHS['java'],
-            'java_xmx': self.server_config['java':'java_xmx'],
-            'java_xms': self.server_config['java':'java_xmx'],
-            'java_tweaks': self.server_config['java':'java_tweaks':''],
-            'java_debug': '',
-            'jarfile': self.server_config['java':'jarfile'],
-            'jar_args': 'nogui'
-        }
+        screen = self.BINARY_PATHS['screen']
+        java = self.BINARY_PATHS['java']
+        # one snapshot lookup for the whole [java] section instead of a
+        # slice-getter round trip per option
+        java_section = self.server_config['java']
+        java_xmx = java_section['java_xmx']
+        java_xms = java_xmx
+        java_tweaks = java_section.get('java_tweaks', '')
+        java_debug = ''
+        jarfile = java_section['jarfile']
 
         try:
-            java_xms = self.server_config.getint('java', 'java_xms')
-            if 0 < java_xms <= int(required_arguments['java_xmx']):
-                required_arguments['java_xms'] = java_xms
-        except (configparser.NoOptionError, ValueError):
+            configured_xms = int(java_section['java_xms'])
+            if 0 < configured_xms <= int(java_xmx):
+                java_xms = configured_xms
+        except (KeyError, ValueError):
             pass
 
         try:
-            if self.server_config.getboolean('java', 'java_debug'):
-                required_arguments['java_debug'] = ' '.join([
+            if configparser.RawConfigParser.BOOLEAN_STATES[java_section['java_debug'].lower()]:
+                java_debug = ' '.join([
                     '-verbose:gc',
                     '-XX:+PrintGCTimeStamps',
                     '-XX:+PrintGCDetails',
                     '-Xloggc:{0}'.format(os.path.join(self.env['cwd'], 'java_gc.log'))
                 ])
-        except (configparser.NoOptionError, ValueError):
+        except KeyError:
             pass
 
-        self._previous_arguments = required_arguments
-        return '%(screen)s -dmS %(screen_name)s ' \
-               '%(java)s -server %(java_debug)s -Xmx%(java_xmx)sM -Xms%(java_xms)sM %(java_tweaks)s ' \
-               '-jar %(jarfile)s %(jar_args)s' % required_arguments
+        self._previous_arguments = {
+            'screen_name': f'mc-{self.server_name}',
+            'screen': screen,
+            'java': java,
+            'java_xmx': java_xmx,
+            'java_xms': java_xms,
+            'java_tweaks': java_tweaks,
+            'java_debug': java_debug,
+            'jarfile': jarfile,
+            'jar_args': 'nogui'
+        }
+        return f'{screen} -dmS mc-{self.server_name} ' \
+               f'{java} -server {java_debug} -Xmx{java_xmx}M -Xms{java_xms}M {java_tweaks} ' \
+               f'-jar {jarfile} nogui'
 
-    @property
+    @cached_property
     @sanitize
     def command_debug(self):
-        command = self.command_start
-        match = re.match(r'^.+ mc-.+? (.+)', command)
-        return match.group(1)
+        # command_start is cached, so this is a single slice off the
+        # known 'screen -dmS mc-<name> ' prefix rather than a second
+        # config read followed by a regex
+        return self.command_start.partition(f'mc-{self.server_name} ')[2]
 
-    @property
+    @cached_property
     @sanitize
     def command_archive(self):
-        required_arguments = {
+        tar = self.BINARY_PATHS['tar']
+        # fixed ASCII format; formatting the fields directly skips
+        # strftime's locale machinery and format-string parse
+        n = datetime.now()
+        timestamp = f'{n.year:04d}-{n.month:02d}-{n.day:02d}_{n.hour:02d}:{n.minute:02d}:{n.second:02d}'
+        archive_filename = os.path.join(self.env['awd'], f'server-{self.server_name}_{timestamp}.tar.gz')
+        self._previous_arguments = {
             'nice': self.BINARY_PATHS['nice'],
-            'tar': self.BINARY_PATHS['tar'],
+            'tar': tar,
             'nice_value': self.NICE_VALUE,
-            'archive_filename': os.path.join(self.env['awd'], 'server-%s_%s.tar.gz' % (
-                self.server_name, time.strftime("%Y-%m-%d_%H:%M:%S"))), 'cwd': '.'
+            'archive_filename': archive_filename,
+            'cwd': '.'
         }
-        self._previous_arguments = required_arguments
-        return '%(nice)s -n %(nice_value)s %(tar)s czf %(archive_filename)s %(cwd)s' % required_arguments
+        return f'{self._nice_prefix} {tar} czf {archive_filename} .'
 
-    @property
+    @cached_property
     @sanitize
     def command_backup(self):
-        required_arguments = {
+        self._previous_arguments = {
             'nice': self.BINARY_PATHS['nice'],
             'nice_value': self.NICE_VALUE,
-            'rdiff': self.BINARY_PATHS['rdiff-backup'],
+            'rdiff': self._rdiff,
             'cwd': self.env['cwd'],
             'bwd': self.env['bwd']
         }
-        self._previous_arguments = required_arguments
-        return '%(nice)s -n %(nice_value)s %(rdiff)s %(cwd)s/ %(bwd)s' % required_arguments
+        return f"{self._nice_prefix} {self._rdiff} {self.env['cwd']}/ {self.env['bwd']}"
 
-    @property
+    @cached_property
     @sanitize
     def command_kill(self):
-        required_arguments = {
-            'kill': self.BINARY_PATHS['kill'],
-            'pid': self.screen_pid
+        kill = self.BINARY_PATHS['kill']
+        pid = self.screen_pid
+        self._previous_arguments = {
+            'kill': kill,
+            'pid': pid
         }
-        self._previous_arguments = required_arguments
-        return '%(kill)s %(pid)s' % required_arguments
+        return f'{kill} {pid}'
 
     @sanitize
     def command_restore(self, step, force):
-        required_arguments = {
-            'rdiff': self.BINARY_PATHS['rdiff-backup'],
-            'force': '--force' if force else '',
+        rdiff = self._rdiff
+        force = '--force' if force else ''
+        self._previous_arguments = {
+            'rdiff': rdiff,
+            'force': force,
             'step': step,
             'bwd': self.env['bwd'],
             'cwd': self.env['cwd']
         }
-        self._previous_arguments = required_arguments
-        return '%(rdiff)s %(force)s --restore-as-of %(step)s %(bwd)s %(cwd)s' % required_arguments
+        return f"{rdiff} {force} --restore-as-of {step} {self.env['bwd']} {self.env['cwd']}"
 
     @sanitize
     def command_prune(self, step):
-        required_arguments = {
-            'rdiff': self.BINARY_PATHS['rdiff-backup'],
+        rdiff = self._rdiff
+        if type(step) is int:
+            step = '%sB' % step
+
+        self._previous_arguments = {
+            'rdiff': rdiff,
             'step': step,
             'bwd': self.env['bwd']
         }
-        if type(required_arguments['step']) is int:
-            required_arguments['step'] = '%sB' % required_arguments['step']
-
-        self._previous_arguments = required_arguments
-        return '%(rdiff)s --force --remove-older-than %(step)s %(bwd)s' % required_arguments
+        return f"{rdiff} --force --remove-older-than {step} {self.env['bwd']}"
 
-    @property
+    @cached_property
     @sanitize
     def command_list_increments(self):
-        required_arguments = {
-            'rdiff': self.BINARY_PATHS['rdiff-backup'],
+        rdiff = self._rdiff
+        self._previous_arguments = {
+            'rdiff': rdiff,
             'bwd': self.env['bwd']
         }
-        self._previous_arguments = required_arguments
-        return '%(rdiff)s --list-increments %(bwd)s' % required_arguments
+        return f"{rdiff} --list-increments {self.env['bwd']}"
 
-    @property
+    @cached_property
     @sanitize
     def command_list_increment_sizes(self):
-        required_arguments = {
-            'rdiff': self.BINARY_PATHS['rdiff-backup'],
+        rdiff = self._rdiff
+        self._previous_arguments = {
+            'rdiff': rdiff,
             'bwd': self.env['bwd']
         }
-        self._previous_arguments = required_arguments
-        return '%(rdiff)s --list-increment-sizes %(bwd)s' % required_arguments
-
-    @sanitize
-    def command_delete_files(self, files):
-        required_arguments = {
-            'files': files,
-        }
-        self._previous_arguments = required_arguments
-        return 'rm -- %(files)s' % required_arguments
-
-    @property
-    @sanitize
-    def command_delete_server(self):
-        required_arguments = {
-            'live': self.env['cwd'],
-            'backup': self.env['bwd'],
-            'archive': self.env['awd']
-        }
-        self._previous_arguments = required_arguments
-        return 'rm -rf -- %(live)s %(backup)s %(archive)s' % required_arguments
+        return f"{rdiff} --list-increment-sizes {self.env['bwd']}"
 
     @sanitize
     def command_chown(self, user, path):
-        required_arguments = {
+        self._previous_arguments = {
             'user': user,
             'path': path
         }
-        self._previous_arguments = required_arguments
-        return 'chown -R %(user)s %(path)s' % required_arguments
+        return f'chown -R {user} {path}'
 
     @sanitize
     def command_chgrp(self, group, path):
-        required_arguments = {
+        self._previous_arguments = {
             'group': group,
             'path': path
         }
-        self._previous_arguments = required_arguments
-        return 'chgrp -R %(group)s %(path)s' % required_arguments
+        return f'chgrp -R {group} {path}'
 
     # generator expressions
 
@@ -749,8 +976,13 @@ class mc(object):
     def list_ports_up(cls, base):
         instance_connection = namedtuple('instance_connection', 'server_name port ip_address')
         for name, java, screen in cls.list_servers_up():
-            instance = cls(name, base_directory=base)
-            yield instance_connection(name, instance.port, instance.ip_address)
+            sp_path = os.path.join(base, cls.DEFAULT_PATHS['servers'], name, 'server.properties')
+            properties = fastparse_file(sp_path).get('sectionless', {})
+            try:
+                port = int(properties['server-port'])
+            except (KeyError, ValueError):
+                port = 25565
+            yield instance_connection(name, port, properties.get('server-ip') or '0.0.0.0')
 
     def list_increments(self):
         incs = namedtuple('increments', 'current_mirror increments')
@@ -771,26 +1003,24 @@ class mc(object):
     def list_increment_sizes(self):
         incs = namedtuple('increments', 'step timestamp increment_size cumulative_size')
 
+        # stream rdiff-backup's stdout line by line instead of buffering
+        # the whole report: memory stays flat for servers with thousands
+        # of increments and the first row reaches the caller before the
+        # subprocess finishes
         try:
-            output = self._command_direct(self.command_list_increment_sizes, self.env['bwd'])
-            assert output is not None
-        except (subprocess.CalledProcessError, AssertionError):
-            return incs('', '', 0, 0)
+            proc = subprocess.Popen(split(self.command_list_increment_sizes), cwd=self.env['bwd'],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                    user=self.owner.pw_uid, group=self.owner.pw_gid, umask=0o002)
+        except OSError:
+            return
 
-        regex = re.compile(r'^(\w.*?) {3,}(.*?) {2,}([^ ]+ \w*)')
         count = 0
-        try:
-            output = output.decode('utf-8', 'ignore')
-        except (UnicodeDecodeError, AttributeError):
-            pass
-
-        for line in output.split('\n'):
-            hits = regex.match(line)
-            try:
-                yield incs('%sB' % count, hits.group(1), hits.group(2), hits.group(3))
-                count += 1
-            except AttributeError:
-                continue
+        with proc:
+            for line in proc.stdout:
+                hits = _INC_SIZE_RE.match(line)
+                if hits:
+                    yield incs('%sB' % count, hits.group(1), hits.group(2), hits.group(3))
+                    count += 1
 
     def list_archives(self):
         arcs = namedtuple('archives', 'filename size timestamp friendly_timestamp path')
@@ -799,76 +1029,108 @@ class mc(object):
             info = os.stat(os.path.join(self.env['awd'], i))
             yield arcs(i, info.st_size, int(info.st_mtime), time.ctime(info.st_mtime), self.env['awd'])
 
+    _SERVERS_UP_TTL = 0.25
+    _servers_up_snapshot = (0.0, None)
+
+    @classmethod
+    def _invalidate_servers_up(cls):
+        '''Force the next list_servers_up to rescan; called after any
+        action that changes the pid set so up/java_pid do not report a
+        0.25s-stale snapshot right after a start or stop. The procfs
+        pid snapshot underneath must go too, or the rescan would read
+        a stale pid set.'''
+        procfs_reader.invalidate_pids()
+        cls._servers_up_snapshot = (0.0, None)
+
     @classmethod
     def list_servers_up(cls):
-        pids = dict(procfs_reader.pid_cmdline())
-        instance_pids = namedtuple('instance_pids', 'server_name java_pid screen_pid')
+        '''One /proc scan shared by every caller within the TTL window:
+        a web-UI poll builds a fresh mc instance per request, so the
+        snapshot is cached at class level rather than per instance.'''
+        now = time.monotonic()
+        timestamp, snapshot = cls._servers_up_snapshot
+        if snapshot is None or now - timestamp >= cls._SERVERS_UP_TTL:
+            snapshot = list(cls._scan_servers_up())
+            cls._servers_up_snapshot = (now, snapshot)
+        return snapshot
 
-        def name_jarfile():
-            for cmdline in pids.values():
-                if 'screen' in cmdline.lower():
-                    serv = re.search(r'SCREEN.*?mc-([\w._]+).*?-jar ([\w._/]+)', cmdline, re.IGNORECASE)
-                    try:
-                        yield serv.groups()[0], serv.groups()[1]
-                    except AttributeError:
-                        continue
+    @classmethod
+    def _scan_servers_up(cls):
+        instance_pids = namedtuple('instance_pids', 'server_name java_pid screen_pid')
 
-        for name, jarfile in name_jarfile():
-            java = None
-            screen = None
-
-            for pid, cmdline in pids.items():
-                if '-jar' in cmdline:
-                    if 'screen' in cmdline.lower() and 'mc-%s' % name in cmdline:
-                        screen = int(pid)
-                    elif jarfile in cmdline:
-                        java = int(pid)
-                    if java and screen:
-                        break
+        # classify every cmdline exactly once: screen sessions keyed by
+        # server name, remaining -jar processes kept as java candidates.
+        # The old nested loops rescanned the whole process list for each
+        # screen session found.
+        screens = {}
+        javas = []
+        for pid, cmdline in procfs_reader.pid_cmdline(comms=('screen', 'java')):
+            if '-jar' not in cmdline:
+                continue
+            if 'screen' in cmdline.lower():
+                serv = _SCREEN_RE.search(cmdline)
+                if serv:
+                    screens[serv.group(1)] = (int(pid), serv.group(2))
+                    continue
+            javas.append((int(pid), cmdline))
+
+        for name, (screen, jarfile) in screens.items():
+            java = next((pid for pid, cmdline in javas if jarfile in cmdline), None)
             yield instance_pids(name, java, screen)
 
     def list_last_loglines(self, lines=100):
         try:
-            with open(self.env['log'], 'r') as log:
+            with open(self.env['log'], 'rb') as log:
                 return procfs_reader.tail(log, int(lines))
         except IOError:
             pass
         return []
 
     @classmethod
-    def list_servers_to_act(cls, action, base_directory):
-        hits = []
-        msm = cls.minutes_since_midnight()
+    def _server_flags(cls, base_directory, server_name, backup=False):
+        '''server.config as nested dicts via the mtime-keyed fastparse
+        cache; the cron classmethods only read a flag or two per server,
+        so constructing a full mc instance (configparser parse of both
+        config files) per server per tick was nearly all overhead.'''
+        path = os.path.join(base_directory,
+                            cls.DEFAULT_PATHS['backup' if backup else 'servers'],
+                            server_name, 'server.config')
+        return fastparse_file(path)
 
-        section_option = ('crontabs', '%s_interval' % action)
+    @classmethod
+    def list_servers_by_actions(cls, actions, base_directory):
+        '''{action: [server, ...]} for every action in one pass: the
+        server list is enumerated once and each server.config is
+        consulted once for all of its intervals, instead of a full
+        directory scan per action.'''
+        hits = {action: [] for action in actions}
+        msm = cls.minutes_since_midnight()
 
         for i in cls.list_servers(base_directory):
-            try:
-                path_ = os.path.join(base_directory, cls.DEFAULT_PATHS['servers'], i)
-                owner_ = procfs_reader.path_owner(path_)
-                instance = cls(i, owner_, base_directory)
-
-                interval = instance.server_config.getint(section_option[0], section_option[1])
-                if msm == 0:
-                    hits.append(i)
-                elif msm % interval == 0:
-                    hits.append(i)
-            except:
-                continue
+            crontabs = cls._server_flags(base_directory, i).get('crontabs', {})
+            for action in actions:
+                try:
+                    interval = int(crontabs['%s_interval' % action])
+                    if msm == 0 or msm % interval == 0:
+                        hits[action].append(i)
+                except (KeyError, ValueError, ZeroDivisionError):
+                    continue
 
         return hits
 
+    @classmethod
+    def list_servers_to_act(cls, action, base_directory):
+        return cls.list_servers_by_actions((action,), base_directory)[action]
+
     @classmethod
     def list_servers_start_at_boot(cls, base_directory):
         hits = []
         for i in cls.list_servers(base_directory):
             try:
-                path_ = os.path.join(base_directory, cls.DEFAULT_PATHS['servers'], i)
-                owner_ = procfs_reader.path_owner(path_)
-                instance = cls(i, owner_, base_directory)
-                if instance.server_config.getboolean('onreboot', 'start'):
+                flag = cls._server_flags(base_directory, i)['onreboot']['start']
+                if configparser.RawConfigParser.BOOLEAN_STATES[flag.lower()]:
                     hits.append(i)
-            except:
+            except KeyError:
                 pass
         return hits
 
@@ -877,25 +1139,32 @@ class mc(object):
         hits = []
         for i in cls.list_servers(base_directory):
             try:
-                path_ = os.path.join(base_directory, cls.DEFAULT_PATHS['backup'], i)
-                owner_ = procfs_reader.path_owner(path_)
-                instance = cls(i, owner_, base_directory)
-                instance._load_config(load_backup=True)
-                if instance.server_config.getboolean('onreboot'):
+                flag = cls._server_flags(base_directory, i, backup=True)['onreboot']['restore']
+                if configparser.RawConfigParser.BOOLEAN_STATES[flag.lower()]:
                     hits.append(i)
-            except:
+            except KeyError:
                 pass
         return hits
 
     @staticmethod
-    def _mtime(filepath):
-        try:
-            return time.ctime(os.path.getmtime(filepath))
-        except os.error:
-            return ''
+    def _mtime(filepath, st=None):
+        # callers that already hold a stat result pass it in rather
+        # than paying a second stat of the same file
+        if st is None:
+            try:
+                st = os.stat(filepath)
+            except os.error:
+                return ''
+        return time.ctime(st.st_mtime)
 
     # filesystem functions
 
+    def _touch(self, path):
+        '''Create an empty file owned by the server owner; a couple of
+        syscalls instead of the fork+execve a 'touch' shell-out paid.'''
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o664))
+        os.chown(path, self.owner.pw_uid, self.owner.pw_gid)
+
     def _make_directory(self, path, do_raise=False):
         try:
             os.makedirs(path)
@@ -906,14 +1175,15 @@ class mc(object):
             os.chmod(path, 0o775)
 
     @staticmethod
-    def has_ownership(username, path):
+    def has_ownership(username, path, user_info=None):
         st = os.stat(path)
         uid = st.st_uid
         gid = st.st_gid
 
-        owner_user = getpwuid(uid)
-        owner_group = getgrgid(gid)
-        user_info = getpwnam(username)
+        owner_user = _pw_uid(uid)
+        owner_group = _gr_gid(gid)
+        if user_info is None:
+            user_info = _pw_nam(username)
 
         if user_info.pw_uid == uid or \
                 user_info.pw_gid == gid or \
@@ -926,38 +1196,51 @@ class mc(object):
 
     @classmethod
     def has_server_rights(cls, username, server_name, base_directory):
+        try:
+            user_info = _pw_nam(username)
+        except KeyError:
+            return False
+
         has_rights = False
         for d in ('servers', 'backup'):
             try:
                 path_ = os.path.join(base_directory, cls.DEFAULT_PATHS[d], server_name)
-                has_rights = cls.has_ownership(username, path_)
+                has_rights = cls.has_ownership(username, path_, user_info)
                 break
             except OSError:
                 pass
         return has_rights
 
     def chown(self, user):
+        # one recursive chown over all three trees: the fork+exec per
+        # directory dominated wall time, not the chown itself
         for d in ('cwd', 'bwd', 'awd'):
             self._make_directory(self.env[d])
-            self._command_direct(self.command_chown(user, self.env[d]), self.env[d])
+        paths = ' '.join(self.env[d] for d in ('cwd', 'bwd', 'awd'))
+        self._command_direct(self.command_chown(user, paths), self.env['cwd'])
 
     def chgrp(self, group):
         for d in ('cwd', 'bwd', 'awd'):
             self._make_directory(self.env[d])
-            self._command_direct(self.command_chgrp(group, self.env[d]), self.env[d])
+        paths = ' '.join(self.env[d] for d in ('cwd', 'bwd', 'awd'))
+        self._command_direct(self.command_chgrp(group, paths), self.env['cwd'])
 
     @staticmethod
     def _list_subdirs(directory):
+        # scandir classifies entries from the dirent type without the
+        # per-entry stat os.walk pays, and skips building the file list
         try:
-            return next(os.walk(directory))[1]
-        except StopIteration:
+            with os.scandir(directory) as entries:
+                return [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+        except OSError:
             return []
 
     @staticmethod
     def _list_files(directory):
         try:
-            return next(os.walk(directory))[2]
-        except StopIteration:
+            with os.scandir(directory) as entries:
+                return [entry.name for entry in entries if entry.is_file(follow_symlinks=False)]
+        except OSError:
             return []
 
     @classmethod
@@ -970,5 +1253,5 @@ class mc(object):
 
     @staticmethod
     def minutes_since_midnight():
-        now = datetime.now()
-        return int(((now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds()) / 60)
+        now = time.localtime()
+        return now.tm_hour * 60 + now.tm_min
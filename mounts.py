@@ -2,11 +2,16 @@
 
 import inspect
 import os
+import threading
+import time
 import types
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from collections import defaultdict
 from grp import getgrall
 from grp import getgrgid
 from grp import getgrnam
+from json import dumps
 from json import loads
 from pwd import getpwnam
 from pwd import getpwuid
@@ -21,6 +26,70 @@ from mineos import mc
 from procfs_reader import proc_loadavg
 
 
+# NSS lookups hit /etc/passwd//etc/group or, worse, a remote backend
+# (LDAP/SSSD) where a single getgrall() can take hundreds of ms; the
+# dashboard calls it on every poll. Results are memoized for a few
+# seconds; lookup failures (e.g. unknown group) propagate uncached.
+_NSS_TTL = 10
+
+_nss_cache = {}
+_nss_lock = threading.Lock()
+
+
+def _nss_cached(key, fetch):
+    now = time.monotonic()
+    with _nss_lock:
+        try:
+            timestamp, value = _nss_cache[key]
+            if now - timestamp < _NSS_TTL:
+                return value
+        except KeyError:
+            pass
+
+    value = fetch()
+    with _nss_lock:
+        _nss_cache[key] = (now, value)
+    return value
+
+
+def _cached_getpwnam(name):
+    return _nss_cached(('pwnam', name), lambda: getpwnam(name))
+
+
+def _cached_getpwuid(uid):
+    return _nss_cached(('pwuid', uid), lambda: getpwuid(uid))
+
+
+def _cached_getgrgid(gid):
+    return _nss_cached(('grgid', gid), lambda: getgrgid(gid))
+
+
+def _cached_getgrnam(name):
+    return _nss_cached(('grnam', name), lambda: getgrnam(name))
+
+
+def _group_index():
+    '''(all_group_names, {login: [group_names]}) from one getgrall()
+    per TTL, so membership checks are dict hits instead of a scan of
+    every group on every request.'''
+
+    def build():
+        names = []
+        members = defaultdict(list)
+        for group in getgrall():
+            names.append(group.gr_name)
+            for login in group.gr_mem:
+                members[login].append(group.gr_name)
+        return names, dict(members)
+
+    return _nss_cached('group_index', build)
+
+
+# upper bound on bytes returned per poll of the live log tail; a
+# burst larger than this is picked up across subsequent polls
+MAX_LOG_CHUNK = 1048576
+
+
 def strongly_expire(func):
     def newfunc(*args, **kwargs):
         cherrypy.response.headers['Expires'] = 'Sun, 19 Nov 1978 05:00:00 GMT'
@@ -58,55 +127,109 @@ class ViewModel(object):
         return str(cherrypy.session['_cp_username'])
 
     def server_list(self):
-        for i in mc.list_servers(self.base_directory):
-            if mc.has_server_rights(self.login, i, self.base_directory):
-                yield i
+        '''Server names the logged-in user has rights to.
+
+        One scandir pass over the servers and backup trees, reusing
+        each DirEntry's stat for the ownership test; the old
+        list_servers + has_server_rights pairing re-statted up to two
+        directories and did three NSS lookups per server.'''
+        login = self.login
+        user_info = _cached_getpwnam(login)
+        member_of = frozenset(_group_index()[1].get(login, ()))
+        is_root = login == 'root'
+
+        def allowed(st):
+            return (is_root or
+                    user_info.pw_uid == st.st_uid or
+                    user_info.pw_gid == st.st_gid or
+                    _cached_getgrgid(st.st_gid).gr_name in member_of)
+
+        stats = defaultdict(list)
+        for d in ('servers', 'backup'):
+            try:
+                with os.scandir(os.path.join(self.base_directory, mc.DEFAULT_PATHS[d])) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stats[entry.name].append(entry.stat(follow_symlinks=False))
+            except OSError:
+                continue
+
+        for name, dir_stats in stats.items():
+            if any(allowed(st) for st in dir_stats):
+                yield name
 
     @cherrypy.expose
-    @cherrypy.tools.json_out()
     @strongly_expire
     def status(self):
-        servers = []
-        for i in self.server_list():
-            try:
-                instance = mc(i, self.login, self.base_directory)
-            except ValueError:
-                continue  # fails valid_server_name
-
-            try:
-                java_xmx = int(instance.server_config['java':'java_xmx'])
-            except (KeyError, ValueError):
-                java_xmx = 0
-
-            srv = {
-                'server_name': i,
-                'jarfile': instance.jarfile,
-                'up': instance.up,
-                'ip_address': instance.ip_address,
-                'port': instance.port,
-                'memory': instance.memory,
-                'java_xmx': java_xmx,
-                'eula': instance.eula
-            }
+        # login is read from the cherrypy session, which is bound to the
+        # request thread; resolve it here before fanning out to workers
+        login = self.login
+        names = list(self.server_list())
+
+        # rows are serialized and flushed in completion order - map()
+        # would hold everything behind one slow ping at the head of the
+        # list - so the browser starts rendering after the first server
+        # instead of after the slowest; the completed body is still one
+        # ordinary JSON array
+        def generate():
+            yield b'['
+            first = True
+            if names:
+                with ThreadPoolExecutor(max_workers=min(32, len(names))) as pool:
+                    futures = [pool.submit(self._server_status, name, login) for name in names]
+                    for future in as_completed(futures):
+                        srv = future.result()
+                        if srv is None:
+                            continue
+                        if not first:
+                            yield b','
+                        first = False
+                        yield dumps(srv).encode('utf-8')
+            yield b']'
+
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        return generate()
+
+    status._cp_config = {'response.stream': True}
+
+    def _server_status(self, server_name, login):
+        try:
+            instance = mc(server_name, login, self.base_directory)
+        except ValueError:
+            return None  # fails valid_server_name
 
-            try:
-                ping = instance.ping
-            except KeyError:
-                continue
-            except IndexError:
-                srv.update({
-                    'protocol_version': '',
-                    'server_version': '',
-                    'motd': '',
-                    'players_online': -1,
-                    'max_players': instance.server_properties['max-players'::0]
-                })
-            else:
-                srv.update(dict(instance.ping._asdict()))
+        try:
+            java_xmx = int(instance.server_config['java':'java_xmx'])
+        except (KeyError, ValueError):
+            java_xmx = 0
+
+        srv = {
+            'server_name': server_name,
+            'jarfile': instance.jarfile,
+            'up': instance.up,
+            'ip_address': instance.ip_address,
+            'port': instance.port,
+            'memory': instance.memory,
+            'java_xmx': java_xmx,
+            'eula': instance.eula
+        }
 
-            servers.append(srv)
+        try:
+            ping = instance.ping
+        except KeyError:
+            return None
+        except IndexError:
+            srv.update({
+                'protocol_version': '',
+                'server_version': '',
+                'motd': '',
+                'players_online': -1,
+                'max_players': instance.server_properties['max-players'::0]
+            })
+        else:
+            srv.update(dict(ping._asdict()))
 
-        return servers
+        return srv
 
 
     @cherrypy.expose
@@ -134,8 +257,8 @@ class ViewModel(object):
         st = os.stat(cwd)
 
         dir_info = {
-            'owner': getpwuid(st.st_uid).pw_name,
-            'group': getgrgid(st.st_gid).gr_name
+            'owner': _cached_getpwuid(st.st_uid).pw_name,
+            'group': _cached_getgrgid(st.st_gid).gr_name
         }
 
         try:
@@ -157,19 +280,20 @@ class ViewModel(object):
     @strongly_expire
     def dashboard(self):
 
-        kb_free = dict(procfs_reader.entries('', 'meminfo'))['MemAvailable']
-        gb_free = str(round(float(kb_free.split()[0]) / 1000 / 1000, 3)) + ' GB'
+        host = procfs_reader.snapshot()
+        gb_free = str(round(float(host.memavailable.split()[0]) / 1000 / 1000, 3)) + ' GB'
 
-        primary_group = getgrgid(getpwnam(self.login).pw_gid).gr_name
+        login = self.login
+        primary_group = _cached_getgrgid(_cached_getpwnam(login).pw_gid).gr_name
+        all_groups, members = _group_index()
 
         return {
-            'uptime': int(procfs_reader.proc_uptime()[0]),
+            'uptime': int(host.uptime),
             'memfree': gb_free,
-            'whoami': self.login,
+            'whoami': login,
             'group': primary_group,
             'df': dict(procfs_reader.disk_free(cherrypy.config['misc.base_directory'])._asdict()),
-            'groups': [i.gr_name for i in getgrall() if self.login in i.gr_mem or self.login == 'root'] + [
-                primary_group],
+            'groups': (list(all_groups) if login == 'root' else members.get(login, [])) + [primary_group],
             'base_directory': self.base_directory,
         }
 
@@ -185,10 +309,15 @@ class ViewModel(object):
 
 
 class Root(object):
-    METHODS = list(m for m in dir(mc) if callable(getattr(mc, m)) \
-                   and not m.startswith('_'))
-    PROPERTIES = list(m for m in dir(mc) if not callable(getattr(mc, m)) \
-                      and not m.startswith('_'))
+    # frozensets: dispatch does a membership test per HTTP request
+    METHODS = frozenset(m for m in dir(mc) if callable(getattr(mc, m))
+                        and not m.startswith('_'))
+    PROPERTIES = frozenset(m for m in dir(mc) if not callable(getattr(mc, m))
+                           and not m.startswith('_'))
+    # methods that take base_directory, introspected once here instead
+    # of a reflective getargspec call per request
+    _BASE_DIR_ARG = frozenset(m for m in METHODS
+                              if 'base_directory' in inspect.signature(getattr(mc, m)).parameters)
 
     def __init__(self):
         self.html_directory = cherrypy.config['misc.html_directory']
@@ -198,7 +327,9 @@ class Root(object):
     @cherrypy.tools.json_out()
     @strongly_expire
     def webui_config(self):
-        return {k.lstrip('webui.'): v for k, v in cherrypy.config.items() if k.startswith('webui.')}
+        # slice, not lstrip: lstrip('webui.') strips characters from the
+        # set {w,e,b,u,i,.}, mangling keys like 'webui.user' to 'ser'
+        return {k[6:]: v for k, v in cherrypy.config.items() if k.startswith('webui.')}
 
     @property
     def login(self):
@@ -227,8 +358,8 @@ class Root(object):
         try:
             if command in self.METHODS:
                 try:
-                    if 'base_directory' in inspect.getargspec(getattr(mc, command)).args:
-                        retval = getattr(mc, command)(base_directory=init_args['base_directory'], **args)
+                    if command in self._BASE_DIR_ARG:
+                        retval = getattr(mc, command)(base_directory=self.base_directory, **args)
                     else:
                         retval = getattr(mc, command)(**args)
                 except TypeError as ex:
@@ -320,17 +451,20 @@ class Root(object):
         try:
             instance = mc(server_name, self.login, self.base_directory)
 
-            if 'log_offset' not in cherrypy.session or 'reset' in args:
-                cherrypy.session['log_offset'] = os.stat(instance.env['log']).st_size
-                retval = instance.list_last_loglines(100)
-            elif not cherrypy.session['log_offset']:
+            if 'reset' in args or not cherrypy.session.get('log_offset'):
                 cherrypy.session['log_offset'] = os.stat(instance.env['log']).st_size
                 retval = instance.list_last_loglines(100)
-            elif cherrypy.session['log_offset']:
-                with open(instance.env['log'], 'r') as log:
+            else:
+                # binary so tell() stays valid after a bounded
+                # readlines(); text-mode files forbid it mid-iteration
+                with open(instance.env['log'], 'rb') as log:
                     log.seek(cherrypy.session['log_offset'], 0)
-                    retval = log.readlines()
-                    cherrypy.session['log_offset'] = os.stat(instance.env['log']).st_size
+                    # bounded read: the next poll resumes from tell(),
+                    # so no re-stat of the path and no unbounded
+                    # readlines() on a log burst
+                    lines = log.readlines(MAX_LOG_CHUNK)
+                    cherrypy.session['log_offset'] = log.tell()
+                retval = [line.decode('utf-8', 'replace') for line in lines]
         except (RuntimeError, KeyError) as ex:
             response['result'] = 'error'
             retval = exception_msg(ex)
@@ -366,7 +500,7 @@ class Root(object):
             group_info = None
             if group:
                 try:
-                    group_info = getgrnam(group)
+                    group_info = _cached_getgrnam(group)
                 except KeyError:
                     raise KeyError("There is no group '%s'" % group)
                 else:
@@ -424,7 +558,7 @@ class Root(object):
             instance.import_server(**args)
             instance = mc(server_name, None, self.base_directory)
             instance.chown(self.login)
-            instance.chgrp(getgrgid(getpwnam(self.login).pw_gid).gr_name)
+            instance.chgrp(_cached_getgrgid(_cached_getpwnam(self.login).pw_gid).gr_name)
         except (RuntimeError, KeyError, OSError, ValueError) as ex:
             response['result'] = 'error'
             retval = exception_msg(ex)
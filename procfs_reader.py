@@ -1,90 +1,226 @@
 import collections
+import functools
 import os
-from binascii import b2a_qp
+import time
 from grp import getgrgid
 from pwd import getpwuid
 
 _PROCFS_PATHS = ['/proc', '/usr/compat/linux/proc', '/system/lxproc']
 
-for procfs in _PROCFS_PATHS:
+# uid/gid resolution can hit remote NSS backends, and the cron loop
+# asks for the same handful of owners every minute; memoize per process
+_pw = functools.lru_cache(maxsize=512)(getpwuid)
+_gr = functools.lru_cache(maxsize=512)(getgrgid)
+
+# one stat per candidate instead of an open/read/close probe; every
+# CLI one-shot pays this at import
+_procfs = next((p for p in _PROCFS_PATHS if os.path.isdir(os.path.join(p, 'self'))), None)
+
+
+# long-lived fds for the tiny host pages the dashboard polls; procfs
+# supports positional reads, so after the first open each refresh
+# costs a single pread instead of an open/read/close cycle
+_page_fds = {}
+
+
+def _read_page(page):
     try:
-        with open(os.path.join(procfs, 'uptime'), 'r') as procdump:
-            _procfs = procfs
+        fd = _page_fds[page]
+    except KeyError:
+        fd = _page_fds[page] = os.open(os.path.join(_procfs, page), os.O_RDONLY)
+    return os.pread(fd, 16384, 0).decode('utf-8', 'ignore')
+
+
+host_snapshot = collections.namedtuple('host_snapshot', 'uptime loadavg memavailable')
+
+
+def snapshot():
+    '''uptime seconds, loadavg triple and MemAvailable (kB string) in
+    one call over reused descriptors.'''
+    uptime = float(_read_page('uptime').split()[0])
+    loadavg = tuple(float(v) for v in _read_page('loadavg').split()[:3])
+    memavailable = None
+    for line in _read_page('meminfo').splitlines():
+        if line.startswith('MemAvailable:'):
+            memavailable = line.partition(':')[2].strip()
             break
-    except IOError:
-        continue
+    return host_snapshot(uptime, loadavg, memavailable)
+
+
+_PIDS_TTL = 1.0
+_pids_snapshot = (0.0, None)
+
+
+def invalidate_pids():
+    '''Drop the pid snapshot so the next pids() call rescans; callers
+    that just started or signalled a process use this to see the new
+    state immediately instead of up to a TTL later.'''
+    global _pids_snapshot
+    _pids_snapshot = (0.0, None)
 
 
 def pids():
-    return set(int(pid) for pid in os.listdir(_procfs) if pid.isdigit())
+    '''Numeric pids under procfs, snapshotted for one second: polling
+    callers re-listing ~500 directory entries between UI refreshes get
+    the cached set instead.'''
+    global _pids_snapshot
+    now = time.monotonic()
+    timestamp, cached = _pids_snapshot
+    if cached is not None and now - timestamp < _PIDS_TTL:
+        return cached
+
+    with os.scandir(_procfs) as it:
+        current = {int(entry.name) for entry in it if entry.name.isdigit()}
+    _pids_snapshot = (now, current)
+    return current
 
 
-def pid_cmdline():
+def pid_exists(pid):
+    return os.path.exists(os.path.join(_procfs, str(pid)))
+
+
+def _slurp(path, size=65536):
+    '''Whole (tiny) file as bytes via raw os.open/os.read: per-pid
+    pages are read once, so the BufferedReader wrapper a normal open
+    allocates around each one is pure overhead.'''
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+def pid_cmdline(comms=None):
+    '''(pid, cmdline) pairs, optionally restricted to processes whose
+    comm (executable name, lowercased) is in `comms`. comm is a tiny
+    one-line read, so pre-filtering turns a cmdline read per pid on the
+    whole system into one per matching process.'''
     for pid in pids():
+        proc_dir = os.path.join(_procfs, str(pid))
         try:
-            with open(os.path.join(_procfs, str(pid), 'cmdline'), 'rb') as fh:
-                cmdline = b2a_qp(fh.read()).decode('utf-8', 'ignore')
-                cmdline = cmdline.replace('=00', ' ').replace('=\n', '').strip()
-                yield pid, cmdline
+            if comms is not None:
+                comm = _slurp(os.path.join(proc_dir, 'comm'))
+                if comm.strip().lower().decode('utf-8', 'ignore') not in comms:
+                    continue
+            # argv comes NUL-separated; no escaping round-trip needed,
+            # just swap the separators for spaces
+            raw = _slurp(os.path.join(proc_dir, 'cmdline'))
+            yield pid, raw.replace(b'\x00', b' ').decode('utf-8', 'ignore').strip()
         except IOError:
             continue
 
 
+def entry(pid, page, key):
+    '''Value of a single `key: value` line, or None if absent.
+
+    Early-returns on the first match, so picking one field out of
+    /proc/meminfo costs a few line reads instead of parsing and
+    dict-ifying the whole page.'''
+    prefix = (key + ':').encode()
+    with open(os.path.join(_procfs, str(pid), page), 'rb') as proc_page:
+        for line in proc_page:
+            if line.startswith(prefix):
+                return line[len(prefix):].strip().decode('utf-8', 'ignore')
+    return None
+
+
 def entries(pid, page):
-    with open(os.path.join(_procfs, str(pid), page), 'rb') as proc_status:
+    with open(os.path.join(_procfs, str(pid), page), 'r') as proc_status:
         for line in proc_status:
-            split = b2a_qp(line).decode('utf-8', 'ignore').partition(':')
+            split = line.partition(':')
             yield split[0].strip(), split[2].strip()
 
 
+_vmrss_cache = {}
+
+
+def vmrss(pid):
+    '''Resident set size of a process in bytes, or None if absent.
+
+    Reads /proc/<pid>/status only up to the VmRSS line instead of
+    dict-ifying all ~55 entries, and caches per pid for 0.5s since
+    dashboards poll faster than the value usefully changes.'''
+    now = time.monotonic()
+    try:
+        timestamp, value = _vmrss_cache[pid]
+        if now - timestamp < 0.5:
+            return value
+    except KeyError:
+        pass
+
+    value = None
+    for line in _slurp(os.path.join(_procfs, str(pid), 'status')).splitlines():
+        if line.startswith(b'VmRSS:'):
+            value = int(line.split()[1]) * 1024
+            break
+
+    if len(_vmrss_cache) > 256:
+        _vmrss_cache.clear()
+    _vmrss_cache[pid] = (now, value)
+    return value
+
+
 def path_owner(path):
     st = os.stat(path)
     uid = st.st_uid
-    return getpwuid(uid).pw_name
+    return _pw(uid).pw_name
 
 
-def pid_owner(pid):
+def pid_owner_group(pid):
+    '''(passwd, group) records of a process from one read of its
+    status page; Uid and Gid sit in the first few lines, so the scan
+    early-exits instead of dict-ifying all ~40 entries.'''
+    uid = gid = None
     try:
-        status_page = dict(entries(pid, 'status'))
+        with open(os.path.join(_procfs, str(pid), 'status'), 'rb') as status:
+            for line in status:
+                if line.startswith(b'Uid:'):
+                    uid = int(line.split()[1])
+                elif line.startswith(b'Gid:'):
+                    gid = int(line.split()[1])
+                if uid is not None and gid is not None:
+                    break
     except IOError:
         raise IOError('Process %s does not exist' % pid)
-    else:
-        return getpwuid(int(status_page['Uid'].partition('\t')[0]))
+    return _pw(uid), _gr(gid)
+
+
+def pid_owner(pid):
+    return pid_owner_group(pid)[0]
 
 
 def pid_group(pid):
-    try:
-        status_page = dict(entries(pid, 'status'))
-    except IOError:
-        raise IOError('Process %s does not exist' % pid)
-    else:
-        return getgrgid(int(status_page['Gid'].partition('\t')[0]))
+    return pid_owner_group(pid)[1]
 
 
 def proc_uptime():
-    raw = next(entries('', 'uptime'))[0]
-    return tuple(float(v) for v in raw.split())
+    return tuple(float(v) for v in _read_page('uptime').split())
 
 
 def proc_loadavg():
-    raw = next(entries('', 'loadavg'))[0]
-    return tuple(float(v) for v in raw.split()[:3])
+    return tuple(float(v) for v in _read_page('loadavg').split()[:3])
+
+
+# (symbol, threshold) pairs, largest first, built once at import;
+# human_readable rebuilt this table with eight shifts per call
+_HR_TABLE = tuple((s, 1 << (i + 1) * 10)
+                  for i, s in reversed(list(enumerate(('K', 'M', 'G', 'T', 'P', 'E', 'Z', 'Y')))))
 
 
 def human_readable(n):
-    symbols = ('K', 'M', 'G', 'T', 'P', 'E', 'Z', 'Y')
-    prefix = {}
-    for i, s in enumerate(symbols):
-        prefix[s] = 1 << (i + 1) * 10
-    for s in reversed(symbols):
-        if n >= prefix[s]:
-            value = float(n) / prefix[s]
-            return '%.1f%s' % (value, s)
+    for symbol, threshold in _HR_TABLE:
+        if n >= threshold:
+            return '%.1f%s' % (float(n) / threshold, symbol)
     return "%sB" % n
 
 
-def disk_free(path):
-    tuple_diskusage = collections.namedtuple('usage', 'total used free')
+tuple_diskusage = collections.namedtuple('usage', 'total used free')
+
+_DISK_FREE_TTL = 5
+
+
+@functools.lru_cache(maxsize=32)
+def _disk_free(path, bucket):
     st = os.statvfs(path)
     free = st.f_bavail * st.f_frsize
     total = st.f_blocks * st.f_frsize
@@ -92,23 +228,60 @@ def disk_free(path):
     return tuple_diskusage(human_readable(total), human_readable(used), human_readable(free))
 
 
+def disk_free(path):
+    '''Filesystem usage for path, recomputed at most every few
+    seconds: the UI polls this at 1 Hz and the namedtuple class itself
+    used to be rebuilt per call.'''
+    return _disk_free(path, int(time.monotonic() / _DISK_FREE_TTL))
+
+
 def disk_usage(path):
-    return sum(os.path.getsize(os.path.join(dirpath, filename))
-               for dirpath, dirnames, filenames in os.walk(path)
-               for filename in filenames)
+    '''Total size in bytes of all files under path.
 
+    Iterative scandir: entry type comes back from the directory read
+    itself and DirEntry.stat reuses it, where the old os.walk +
+    getsize pair paid a second stat() per file. Unreadable
+    subdirectories are skipped rather than aborting the total.
 
-def tail(f, lines=50):
-    # https://stackoverflow.com/a/13790289
-    lines_found = []
-    block_counter = -1
-    while len(lines_found) < lines:
+    A tree that is its own mount point is answered from statvfs in
+    one syscall - used blocks of a dedicated volume are the tree's
+    usage - instead of an O(files) walk.'''
+    if os.path.ismount(path):
+        st = os.statvfs(path)
+        return (st.f_blocks - st.f_bfree) * st.f_frsize
+
+    total = 0
+    stack = [path]
+    while stack:
         try:
-            f.seek(block_counter * 4098, os.SEEK_END)
-        except IOError:
-            f.seek(0)
-            lines_found = f.readlines()
-            break
-        lines_found = f.readlines()
-        block_counter -= 1
-    return lines_found[-lines:]
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+def tail(f, lines=50):
+    '''Last `lines` lines of an open binary file.
+
+    Steps backwards from EOF in 8 KiB blocks until enough newlines are
+    buffered, so cost is proportional to the lines requested rather
+    than the file size; the old readlines() loop re-read everything
+    from the seek point to EOF on every backwards step.'''
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    block = 8192
+    chunks = collections.deque()
+    newlines = 0
+    while size > 0 and newlines <= lines:
+        step = min(block, size)
+        size -= step
+        f.seek(size)
+        chunk = f.read(step)
+        chunks.appendleft(chunk)
+        newlines += chunk.count(b'\n')
+    return b''.join(chunks).decode('utf-8', 'replace').splitlines(keepends=True)[-lines:]
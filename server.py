@@ -3,6 +3,7 @@
 import os
 import sys
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import CalledProcessError
 from time import sleep
 
@@ -23,74 +24,101 @@ class cron(cherrypy.process.plugins.SimplePlugin):
         except (ValueError, TypeError):
             self.commit_delay = 10
 
-    def check_interval(self):
+    def _instance(self, server):
+        path_ = os.path.join(self.base_directory, mc.DEFAULT_PATHS['servers'], server)
+        return mc(server, path_owner(path_), self.base_directory)
 
-        crons = []
+    def _commit(self, instance):
+        server = instance.server_name
 
-        for action in ('restart', 'backup', 'archive'):
-            for server in mc.list_servers_to_act(action, self.base_directory):
-                crons.append((action, server))
+        cherrypy.log('[%s] commit' % server)
+        try:
+            instance._command_stuff('save-off')
+            instance.commit()
+        except RuntimeError:
+            pass
+        else:
+            cherrypy.log('[%s] commit command received by process; sleeping %ssec' % (server, self.commit_delay))
+            sleep(self.commit_delay)
 
-        for server in set(s for a, s in crons):
-            path_ = os.path.join(self.base_directory, mc.DEFAULT_PATHS['servers'], server)
-            instance = mc(server, path_owner(path_), self.base_directory)
+    def _act(self, action, instance):
+        server = instance.server_name
 
-            cherrypy.log('[%s] commit' % server)
+        if action == 'restart':
+            cherrypy.log('[%s] stop' % server)
             try:
-                instance._command_stuff('save-off')
-                instance.commit()
+                instance._command_stuff('stop')
             except RuntimeError:
                 pass
             else:
-                cherrypy.log('[%s] commit command received by process; sleeping %ssec' % (server, self.commit_delay))
+                cherrypy.log('[%s] stop command received by process; sleeping %ssec' % (server, self.commit_delay))
                 sleep(self.commit_delay)
-
-        for action, server in crons:
-            path_ = os.path.join(self.base_directory, mc.DEFAULT_PATHS['servers'], server)
-            instance = mc(server, path_owner(path_), self.base_directory)
-
-            if action == 'restart':
-                cherrypy.log('[%s] stop' % server)
-                try:
-                    instance._command_stuff('stop')
-                except RuntimeError:
-                    pass
-                else:
-                    cherrypy.log('[%s] stop command received by process; sleeping %ssec' % (server, self.commit_delay))
-                    sleep(self.commit_delay)
-            elif action in ('backup', 'archive'):
+        elif action in ('backup', 'archive'):
+            cherrypy.log('[%s] %s (Server Up: %s)' % (server, action, instance.up))
+            try:
+                getattr(instance, action)()
+            except CalledProcessError as e:
+                cherrypy.log('[%s] %s exception: returncode %s' % (server, action, e.returncode))
+                cherrypy.log(e.output)
+            except RuntimeError:
+                cherrypy.log(
+                    '[%s] %s exception: server state changed since beginning of %s.' % (server, action, action))
                 cherrypy.log('[%s] %s (Server Up: %s)' % (server, action, instance.up))
-                try:
-                    getattr(instance, action)()
-                except CalledProcessError as e:
-                    cherrypy.log('[%s] %s exception: returncode %s' % (server, action, e.returncode))
-                    cherrypy.log(e.output)
-                except RuntimeError:
-                    cherrypy.log(
-                        '[%s] %s exception: server state changed since beginning of %s.' % (server, action, action))
-                    cherrypy.log('[%s] %s (Server Up: %s)' % (server, action, instance.up))
-                    cherrypy.log('You may need to increase mineos.conf => server.commit_delay')
-                else:
-                    cherrypy.log('[%s] %s return code reports success; sleeping 3sec' % (server, action))
-                    sleep(3)
+                cherrypy.log('You may need to increase mineos.conf => server.commit_delay')
+            else:
+                cherrypy.log('[%s] %s return code reports success; sleeping 3sec' % (server, action))
+                sleep(3)
+
+    def _finish_restart(self, instance):
+        server = instance.server_name
 
+        if instance.up:
+            cherrypy.log('[%s] extra delay; sleeping %s seconds' % (server, self.commit_delay))
+            sleep(self.commit_delay)
+
+        cherrypy.log('[%s] start' % server)
+        try:
+            instance.start()
+        except RuntimeError:
+            pass
+        else:
+            cherrypy.log('[%s] started; sleeping %s seconds' % (server, self.commit_delay))
+            sleep(self.commit_delay)
+
+    def check_interval(self):
+
+        scheduled = mc.list_servers_by_actions(('restart', 'backup', 'archive'), self.base_directory)
+        crons = [(action, server)
+                 for action in ('restart', 'backup', 'archive')
+                 for server in scheduled[action]]
+
+        if not crons:
+            return
+
+        # per-server work is independent and dominated by commit_delay
+        # sleeps; a pool overlaps them so each phase costs roughly one
+        # delay instead of one per server. Phases still run to
+        # completion in order: every commit settles before any action,
+        # every stop before any start.
+        # one mc per server per tick: the old passes rebuilt the same
+        # instance (stat + owner lookup + config load) up to three times
+        instances = {s: self._instance(s) for s in set(s for a, s in crons)}
+
+        # actions grouped per server, in schedule order: a server whose
+        # restart and backup both fire this tick must not stop and
+        # rdiff concurrently - only different servers run in parallel
+        actions_by_server = {}
         for action, server in crons:
-            path_ = os.path.join(self.base_directory, mc.DEFAULT_PATHS['servers'], server)
-            instance = mc(server, path_owner(path_), self.base_directory)
+            actions_by_server.setdefault(server, []).append(action)
 
-            if action == 'restart':
-                if instance.up:
-                    cherrypy.log('[%s] extra delay; sleeping %s seconds' % (server, self.commit_delay))
-                    sleep(self.commit_delay)
+        def act_in_order(server):
+            for action in actions_by_server[server]:
+                self._act(action, instances[server])
 
-                cherrypy.log('[%s] start' % server)
-                try:
-                    instance.start()
-                except RuntimeError:
-                    pass
-                else:
-                    cherrypy.log('[%s] started; sleeping %s seconds' % (server, self.commit_delay))
-                    sleep(self.commit_delay)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(self._commit, instances.values()))
+            list(pool.map(act_in_order, actions_by_server))
+            list(pool.map(self._finish_restart, [instances[s] for a, s in crons if a == 'restart']))
 
 
 if __name__ == "__main__":
@@ -218,28 +246,32 @@ if __name__ == "__main__":
         web_root = '/' + web_root
     cherrypy.config['misc.web_root'] = web_root
 
+    # static assets change only on upgrade: let browsers cache them for
+    # a day and revalidate with 304s, and gzip the text-based ones, so
+    # repeat page loads stop tying up worker threads shipping bytes
+    static_conf = {
+        'tools.expires.on': True,
+        'tools.expires.secs': 86400,
+        'tools.gzip.on': True,
+        'tools.gzip.mime_types': ['text/*', 'application/javascript', 'application/json']
+    }
+
     root_conf = {
-        '/assets': {
-            'tools.staticdir.on': True,
-            'tools.staticdir.dir': os.path.join(html_dir, 'assets')
-        },
-        '/css': {
-            'tools.staticdir.on': True,
-            'tools.staticdir.dir': os.path.join(html_dir, 'css')
-        },
-        '/img': {
-            'tools.staticdir.on': True,
-            'tools.staticdir.dir': os.path.join(html_dir, 'img')
-        },
-        '/js': {
-            'tools.staticdir.on': True,
-            'tools.staticdir.dir': os.path.join(html_dir, 'js')
-        },
-        '/favicon.png':
-            {
-                'tools.staticfile.on': True,
-                'tools.staticfile.filename': os.path.join(html_dir, 'favicon.png')
-            }
+        '/assets': dict(static_conf,
+                        **{'tools.staticdir.on': True,
+                           'tools.staticdir.dir': os.path.join(html_dir, 'assets')}),
+        '/css': dict(static_conf,
+                     **{'tools.staticdir.on': True,
+                        'tools.staticdir.dir': os.path.join(html_dir, 'css')}),
+        '/img': dict(static_conf,
+                     **{'tools.staticdir.on': True,
+                        'tools.staticdir.dir': os.path.join(html_dir, 'img')}),
+        '/js': dict(static_conf,
+                    **{'tools.staticdir.on': True,
+                       'tools.staticdir.dir': os.path.join(html_dir, 'js')}),
+        '/favicon.png': dict(static_conf,
+                             **{'tools.staticfile.on': True,
+                                'tools.staticfile.filename': os.path.join(html_dir, 'favicon.png')})
     }
 
     empty_conf = {